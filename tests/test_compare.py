@@ -0,0 +1,84 @@
+# utb: UVa Online Judge toolbox
+# Copyright (C) 2024-2025  Daniel Donadon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import time
+
+from utb.compare import Comparator, Difference
+
+
+class Settings:
+
+    def __init__(self, **settings):
+        self.settings = {'compare': 'exact', 'compare-tolerance': 1e-6}
+        self.settings.update(settings)
+
+    def get(self, key):
+        return self.settings[key]
+
+
+def compare(output, answer):
+    return Comparator(Settings()).compare(output, answer)
+
+
+def test_exact_match():
+    assert compare(b'3\n7\n', b'3\n7\n') is None
+    assert compare(b'', b'') is None
+
+
+def test_exact_output_longer_than_answer():
+    assert compare(b'3\n7\n', b'3\n') == Difference(2, 1)
+    assert compare(b'3\nextra junk\n', b'3\n') == Difference(2, 1)
+
+
+def test_exact_output_shorter_than_answer():
+    assert compare(b'3\n', b'3\n7\n') == Difference(2, 1)
+
+
+def test_exact_output_longer_across_chunks():
+    size = Comparator.CHUNK_SIZE
+    assert compare(b'x' * size + b'y', b'x' * size) == Difference(1, size + 1)
+    assert compare(b'x' * (size - 1) + b'yz',
+                   b'x' * size) == Difference(1, size)
+
+
+def test_diff_mode_compares_exactly():
+    comparator = Comparator(Settings(compare='diff'))
+    assert comparator.mode == 'exact'
+    assert comparator.compare(b'3\n7\n', b'3\n') == Difference(2, 1)
+
+
+def test_exact_difference_inside_later_chunk():
+    size = Comparator.CHUNK_SIZE
+    output = b'ab\n' * size + b'cd\nef\n'
+    answer = b'ab\n' * size + b'cd\nEf\n'
+    assert compare(output, answer) == Difference(size + 2, 1)
+
+
+def test_large_identical_outputs(tmp_path):
+    # Files large enough to be memory-mapped are compared in well under
+    # the time a byte-by-byte comparison takes
+    data = b'123456789 987654321\n' * (Comparator.MMAP_SIZE // 20 + 1)
+    output, answer = tmp_path / 'output', tmp_path / 'answer'
+    output.write_bytes(data)
+    answer.write_bytes(data)
+    for mode in Comparator.MODES:
+        comparator = Comparator(Settings(compare=mode))
+        start = time.perf_counter()
+        assert comparator.compare(str(output), str(answer)) is None
+        assert time.perf_counter() - start < 0.5
+    answer.write_bytes(data[:-2] + b'0\n')
+    assert compare(str(output),
+                   str(answer)) == Difference(data.count(b'\n'), 19)
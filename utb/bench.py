@@ -0,0 +1,126 @@
+# utb: UVa Online Judge toolbox
+# Copyright (C) 2024-2025  Daniel Donadon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import math
+import os
+import statistics
+
+from .calibration import Calibration
+from .submission import Submission
+
+
+def percentile(values, rank):
+    # Nearest-rank percentile, which is always one of the measured values
+    values = sorted(values)
+    index = max(0, math.ceil(rank / 100 * len(values)) - 1)
+    return values[index]
+
+
+class Bench:
+
+    def __init__(self, workbench):
+        self.toolbox = workbench.toolbox
+        self.workbench = workbench
+        self.problem = workbench.problem
+
+    def warm(self, *filenames):
+        # Reading the files once loads them into the page cache, so the
+        # first measured run does not pay for the disk
+        for filename in filenames:
+            if filename and os.path.isfile(filename):
+                with open(filename, 'rb') as stream:
+                    while stream.read(1 << 20):
+                        pass
+
+    def measure(self, test, has_answer, runs, warmup, cpu):
+        timeout = self.problem.time_limit / 1000
+        self.warm(self.workbench.get_filename(f'{ test }.in'),
+                  self.workbench.exe_path)
+        times, memory = [], []
+        for run in range(warmup + runs):
+            result = self.workbench.run_test(test,
+                                             has_answer and run == 0,
+                                             timeout,
+                                             affinity=cpu)
+            if result['verdict'] not in [None, 90]:
+                return result['verdict'], times, memory
+            if run >= warmup:
+                usage = result['usage']
+                times.append(usage.user + usage.system)
+                memory.append(usage.memory)
+        return None, times, memory
+
+    def run(self, *suite, runs=None, warmup=None, cpu=None):
+        self.workbench.check_source_file()
+        if not self.workbench.compile(quiet=True):
+            return
+        testcases = self.workbench.get_testcases()
+        for test in suite:
+            if test not in testcases:
+                raise Exception(f'test case not found: { test }')
+        if not testcases:
+            self.toolbox.console.print('There are no test cases to run')
+            return True
+        runs = max(1, runs or self.toolbox.get('bench-runs'))
+        if warmup is None:
+            warmup = self.toolbox.get('bench-warmup')
+        if cpu is None:
+            cpu = self.toolbox.get('bench-cpu')
+        assert cpu is None or self.toolbox.process.can_pin(cpu), (
+            'cannot pin runs to CPU %d' % cpu)
+        limit = self.problem.time_limit / 1000
+        best = self.problem.best_time / 1000
+        self.toolbox.console.alternate('Time limit', '%.3fs' % limit,
+                                       ' Best time', '%.3fs' % best, ' Runs',
+                                       runs, ' Warm-up', warmup, ' CPU',
+                                       'any' if cpu is None else cpu)
+        tests = suite if suite else sorted(testcases.keys())
+        width = max(4, max(len(test) for test in tests))
+        self.toolbox.console.print('%-*s' % (width, 'Test'),
+                                   '%7s' % 'Min',
+                                   '%7s' % 'Median',
+                                   '%7s' % 'P95',
+                                   '%9s' % 'Memory',
+                                   '%8s' % 'Headroom',
+                                   '%8s' % 'Best gap',
+                                   bold=True,
+                                   sep='  ')
+        success, slowest = True, 0
+        for test in tests:
+            self.toolbox.console.print('%-*s' % (width, test),
+                                       bold=True,
+                                       end='  ')
+            verdict, times, memory = self.measure(test, testcases[test], runs,
+                                                  warmup, cpu)
+            if verdict is not None:
+                success = False
+                self.toolbox.console.print(Submission.VERDICT_CODES[verdict][1],
+                                           bold=True)
+                continue
+            median = statistics.median(times)
+            slowest = max(slowest, median)
+            worst = percentile(times, 95)
+            self.toolbox.console.print('%6.3fs' % min(times),
+                                       '%6.3fs' % median,
+                                       '%6.3fs' % worst,
+                                       '%6.1f MB' % (max(memory) / 1024),
+                                       '%7.0f%%' % (100 * (1 - worst / limit)),
+                                       '%+7.3fs' % (median - best),
+                                       sep='  ')
+        if success and slowest:
+            Calibration(self.toolbox).print_prediction(
+                self.problem, self.toolbox.get('language'), slowest)
+        return success
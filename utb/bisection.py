@@ -0,0 +1,169 @@
+# utb: UVa Online Judge toolbox
+# Copyright (C) 2024-2025  Daniel Donadon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import datetime
+import difflib
+import gzip
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from .compare import Comparator
+from .history import TestHistory
+from .program import Program
+from .submission import Submission
+
+
+class Bisect:
+    scratch_dir = '.bisect'
+
+    def __init__(self, workbench):
+        self.toolbox = workbench.toolbox
+        self.workbench = workbench
+        self.problem = workbench.problem
+        self.store = workbench.snapshots
+        self.scratch = os.path.abspath(
+            os.path.join(workbench.dir(), self.scratch_dir))
+
+    def extract(self, index):
+        # Each snapshot is built in its own directory, so snapshots can be
+        # compiled and run in parallel
+        _, digest, filename, language = self.snapshots[index]
+        dir = os.path.join(self.scratch, str(index))
+        os.makedirs(dir, exist_ok=True)
+        path = os.path.join(dir, filename)
+        self.store.get(digest, path)
+        return Program(self.toolbox,
+                       path,
+                       language=language,
+                       problem=self.problem)
+
+    def probe(self, index):
+        # Returns whether the snapshot passes the test, or None when it does
+        # not compile, along with its verdict and CPU time
+        program = self.extract(index)
+        if not program.compile(quiet=True):
+            return index, None, 30, 0
+        files = {
+            extension: os.path.join(program.dir, f'test.{ extension }')
+            for extension in ['out', 'err']
+        }
+        command = program.command(input=self.input,
+                                  output=files['out'],
+                                  error=files['err'])
+        usage = self.toolbox.process.profile(command,
+                                             dir=program.dir,
+                                             timeout=self.timeout,
+                                             limits=self.workbench.get_limits())
+        time = usage.user + usage.system
+        verdict = self.workbench.get_verdict(usage, files['err'])
+        if verdict is None:
+            comparator = Comparator(self.toolbox)
+            answer = self.answer or files['out']
+            verdict = 70 if comparator.compare(files['out'], answer) else 90
+        if self.answer is None:
+            # Without an answer, the output of the oldest snapshot is taken
+            # as the reference
+            self.answer = os.path.join(self.scratch, 'reference.out')
+            shutil.copy(files['out'], self.answer)
+        passed = verdict == 90 and (self.baseline is None or
+                                    time <= self.threshold * self.baseline)
+        return index, passed, verdict, time
+
+    def report(self, index, passed, verdict, time):
+        date, digest, filename, _ = self.snapshots[index]
+        date = datetime.datetime.fromtimestamp(date)
+        self.toolbox.console.print('%5s' % f'#{ index }',
+                                   date.strftime('%Y-%m-%d %H:%M'),
+                                   digest[:8],
+                                   '%-8s' % filename,
+                                   '%6.3fs' % time,
+                                   Submission.VERDICT_CODES[verdict][1],
+                                   sep='  ',
+                                   end='  ')
+        self.toolbox.console.print(
+            'skip' if passed is None else 'good' if passed else 'bad',
+            bold=True)
+
+    def read(self, index):
+        _, digest, _, _ = self.snapshots[index]
+        with gzip.open(self.store.object_path(digest), 'rt',
+                       errors='replace') as stream:
+            return stream.readlines()
+
+    def run(self, test, threshold=None, jobs=None):
+        self.snapshots = self.store.list(self.problem)
+        assert len(self.snapshots) >= 2, 'there are not enough snapshots'
+        self.input = os.path.abspath(
+            self.workbench.get_filename(f'{ test }.in'))
+        assert os.path.isfile(self.input), f'test case not found: { test }'
+        answer = os.path.abspath(self.workbench.get_filename(f'{ test }.ans'))
+        self.answer = answer if os.path.isfile(answer) else None
+        self.timeout = self.problem.time_limit / 1000
+        self.threshold = threshold or self.toolbox.get('history-threshold')
+        self.baseline = None
+        jobs = max(1, jobs or self.toolbox.get('test-jobs') or 1)
+        self.toolbox.console.alternate('Bisecting', len(self.snapshots),
+                                       'snapshots on test', test,
+                                       ' Parallel jobs', jobs)
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                self.search(executor, jobs)
+        finally:
+            shutil.rmtree(self.scratch, ignore_errors=True)
+
+    def search(self, executor, jobs):
+        # The oldest snapshot must pass and sets the baseline time, then the
+        # snapshots in between are probed at evenly spaced points, one for
+        # each job, narrowing the range to the first snapshot that fails
+        first = self.probe(0)
+        self.report(*first)
+        if not first[1]:
+            self.toolbox.console.print('The oldest snapshot does not pass')
+            return
+        self.baseline = max(first[3], TestHistory.MIN_TIME)
+        good, bad = 0, len(self.snapshots) - 1
+        last = self.probe(bad)
+        self.report(*last)
+        if last[1] is not False:
+            self.toolbox.console.print('The latest snapshot passes')
+            return
+        skipped = set()
+        while True:
+            between = [
+                index for index in range(good + 1, bad) if index not in skipped
+            ]
+            if not between:
+                break
+            count = min(jobs, len(between))
+            points = sorted({
+                between[(k + 1) * len(between) // (count + 1)]
+                for k in range(count)
+            })
+            for index, passed, verdict, time in executor.map(
+                    self.probe, points):
+                self.report(index, passed, verdict, time)
+                if passed is None:
+                    skipped.add(index)
+                elif not passed:
+                    bad = min(bad, index)
+                elif index < bad:
+                    good = max(good, index)
+        self.toolbox.console.alternate('First bad snapshot', f'#{ bad }',
+                                       'after good snapshot', f'#{ good }')
+        diff = difflib.unified_diff(self.read(good), self.read(bad),
+                                    f'#{ good }', f'#{ bad }')
+        self.toolbox.console.print(''.join(diff), end='')
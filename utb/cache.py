@@ -0,0 +1,199 @@
+# utb: UVa Online Judge toolbox
+# Copyright (C) 2024-2025  Daniel Donadon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import hashlib
+import os
+import re
+import shlex
+import shutil
+import threading
+
+from .compare import Difference
+from .process import Usage
+
+
+def identify_compiler(command):
+    # The compiler binary is identified by its path, size and modification
+    # time, which change whenever it is upgraded
+    compiler = shutil.which(shlex.split(command)[0]) if command else None
+    if not compiler:
+        return b''
+    stat = os.stat(compiler)
+    return b'%s %d %d' % (compiler.encode(), stat.st_size, stat.st_mtime_ns)
+
+
+class CompileCache:
+    INCLUDE = re.compile(rb'^\s*#\s*include\s*"([^"]+)"', re.MULTILINE)
+    stamp_filename = '.build'
+
+    def __init__(self, toolbox):
+        self.toolbox = toolbox
+        self.base_dir = os.path.join(toolbox.get('data-dir'), 'compile')
+        self.size = toolbox.get('compile-cache')
+        # Builds may be stored from several threads, such as in `regress`
+        self.lock = threading.Lock()
+
+    def key(self, dir, source, command):
+        # The key covers the source, the expanded compile command, the
+        # compiler binary and every local header included by the source
+        digest = hashlib.sha256()
+        digest.update(command.encode())
+        digest.update(identify_compiler(command))
+        pending, seen = [source], set()
+        while pending:
+            filename = pending.pop()
+            path = os.path.normpath(os.path.join(dir, filename))
+            if path in seen or not os.path.isfile(path):
+                continue
+            seen.add(path)
+            with open(path, 'rb') as stream:
+                content = stream.read()
+            digest.update(filename.encode() + b'\0' + content)
+            base = os.path.dirname(filename)
+            pending.extend(
+                os.path.join(base, include.decode(errors='replace'))
+                for include in self.INCLUDE.findall(content))
+        return digest.hexdigest()
+
+    def entry(self, key):
+        return os.path.join(self.base_dir, key[:2], key)
+
+    def is_built(self, dir, exe, key):
+        stamps = self.toolbox.read_json(os.path.join(dir, self.stamp_filename),
+                                        default={})
+        return (os.path.isfile(os.path.join(dir, exe)) and
+                stamps.get(exe) == key)
+
+    def stamp(self, dir, exe, key):
+        filename = os.path.join(dir, self.stamp_filename)
+        stamps = self.toolbox.read_json(filename, default={})
+        stamps[exe] = key
+        self.toolbox.write_json(filename, stamps)
+
+    def snapshot(self, dir):
+        return {
+            name: os.stat(os.path.join(dir, name)).st_mtime_ns
+            for name in os.listdir(dir)
+            if os.path.isfile(os.path.join(dir, name))
+        }
+
+    def restore(self, dir, exe, key):
+        entry = self.entry(key)
+        with self.lock:
+            if not self.size or not os.path.isdir(entry):
+                return False
+            for name in os.listdir(entry):
+                shutil.copy2(os.path.join(entry, name), os.path.join(dir, name))
+            os.utime(entry)
+        self.stamp(dir, exe, key)
+        return True
+
+    def store(self, dir, exe, key, before, shared=True):
+        # Every file created or modified by the compiler is an artifact of
+        # the build, such as the auxiliary classes generated by javac. Builds
+        # that are not shared are only stamped in their own directory
+        self.stamp(dir, exe, key)
+        if not self.size or not shared:
+            return
+        after = self.snapshot(dir)
+        artifacts = [
+            name for name, mtime in after.items()
+            if before.get(name) != mtime and name != self.stamp_filename
+        ]
+        entry = self.entry(key)
+        temporary = entry + '.tmp'
+        with self.lock:
+            shutil.rmtree(temporary, ignore_errors=True)
+            os.makedirs(temporary)
+            for name in artifacts:
+                shutil.copy2(os.path.join(dir, name), temporary)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.rename(temporary, entry)
+            self.prune()
+
+    @staticmethod
+    def modified(entry):
+        # Entries may still be removed by another instance of the toolbox
+        try:
+            return os.path.getmtime(entry)
+        except FileNotFoundError:
+            return 0
+
+    def prune(self):
+        entries = []
+        for prefix in os.listdir(self.base_dir):
+            try:
+                keys = os.listdir(os.path.join(self.base_dir, prefix))
+            except FileNotFoundError:
+                continue
+            entries.extend(
+                os.path.join(self.base_dir, prefix, key)
+                for key in keys
+                if not key.endswith('.tmp'))
+        entries.sort(key=self.modified, reverse=True)
+        for entry in entries[self.size:]:
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+class ResultCache:
+    # Results of test cases are kept for each problem, keyed by the hash of
+    # everything they depend on. Only the most recent ones are kept
+    size = 1000
+
+    def __init__(self, toolbox):
+        self.toolbox = toolbox
+        self.base_dir = os.path.join(toolbox.get('data-dir'), 'results')
+        self.enabled = toolbox.get('result-cache')
+
+    def filename(self, problem):
+        return os.path.join(self.base_dir, '%d.json' % problem.number)
+
+    def load(self, problem):
+        if not self.enabled:
+            return {}
+        return self.toolbox.read_json(self.filename(problem), default={})
+
+    def save(self, problem, results):
+        if self.enabled:
+            results = dict(list(results.items())[-self.size:])
+            self.toolbox.write_json(self.filename(problem), results)
+
+    @staticmethod
+    def cacheable(result):
+        # A time limit depends on the load of the machine, as parallel jobs
+        # compete for the processors and runs are killed by wall time, so
+        # it is measured again on the next run
+        return result['verdict'] != 50 and not result['usage'].timeout
+
+    @staticmethod
+    def encode(result):
+        return {
+            'usage': list(result['usage']),
+            'verdict': result['verdict'],
+            'difference': result['difference'],
+            'stderr': result['stderr']
+        }
+
+    @staticmethod
+    def decode(entry):
+        difference = entry['difference']
+        return {
+            'usage': Usage(*entry['usage']),
+            'verdict': entry['verdict'],
+            'difference': Difference(*difference) if difference else None,
+            'stderr': entry['stderr'],
+            'cached': True
+        }
@@ -0,0 +1,139 @@
+# utb: UVa Online Judge toolbox
+# Copyright (C) 2024-2025  Daniel Donadon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import math
+from collections import namedtuple
+
+from .regress import Regress
+
+Model = namedtuple('Model', 'alpha beta deviation points mean spread')
+
+
+class Calibration(Regress):
+    # Archived solutions accepted by the judge run again locally, so their
+    # local CPU time can be paired with their judge runtime. A model of the
+    # form judge = exp(alpha) * local ^ beta is fitted for each language by
+    # least squares on the logarithms, where judge data is compared with the
+    # slowest local test, as judges usually run a single large input
+    name = 'calibration'
+    JUDGE_LANGUAGES = {
+        'c': 'C',
+        'c99': 'C99',
+        'cpp': 'C++',
+        'java': 'Java',
+        'pascal': 'Pascal',
+        'python': 'Python',
+    }
+    MIN_TIME = 0.01
+    MIN_POINTS = 3
+    DEVIATIONS = 2  # width of the band, about 95% of the judge runtimes
+
+    def judge_runtime(self, problem, language):
+        # Best runtime of the accepted submissions in the same language
+        code = self.JUDGE_LANGUAGES.get(language)
+        runtimes = [
+            submission.runtime / 1000
+            for submission in problem.history.get_accepted_submissions()
+            if submission.language == code and submission.runtime is not None
+        ]
+        return min(runtimes) if runtimes else None
+
+    def find(self, volumes):
+        for name, problem, tests, program in super().find(volumes):
+            if self.judge_runtime(problem, program.language) is not None:
+                yield name, problem, tests, program
+
+    def get_points(self, state=None):
+        # Returns the pairs of local and judge times of each language
+        if state is None:
+            state = self.toolbox.read_json(self.filename, default={})
+        points = {}
+        for name, (_, verdict, time, _) in state.items():
+            number, language = name.split('-', 1)
+            problem = self.toolbox.problemset.list.get(int(number))
+            runtime = problem and self.judge_runtime(problem, language)
+            if (verdict == 90 and runtime and time >= self.MIN_TIME and
+                    runtime >= self.MIN_TIME):
+                points.setdefault(language, []).append((time, runtime))
+        return points
+
+    @classmethod
+    def fit(cls, points):
+        if len(points) < cls.MIN_POINTS:
+            return None
+        xs = [math.log(local) for local, _ in points]
+        ys = [math.log(judge) for _, judge in points]
+        mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+        spread = sum((x - mean_x)**2 for x in xs)
+        # Local times that barely vary only determine the ratio
+        beta = (sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) /
+                spread if spread > 1e-6 else 1.0)
+        alpha = mean_y - beta * mean_x
+        freedom = len(points) - (2 if spread > 1e-6 else 1)
+        deviation = math.sqrt(
+            sum((y - alpha - beta * x)**2 for x, y in zip(xs, ys)) /
+            max(1, freedom))
+        return Model(alpha, beta, deviation, len(points), mean_x, spread)
+
+    def get_model(self, language):
+        return self.fit(self.get_points().get(language, []))
+
+    @classmethod
+    def predict(cls, model, time):
+        # Returns the predicted judge runtime and the band around it
+        x = math.log(max(time, cls.MIN_TIME))
+        error = model.deviation * math.sqrt(1 + 1 / model.points + (
+            (x - model.mean)**2 / model.spread if model.spread > 1e-6 else 0))
+        y = model.alpha + model.beta * x
+        return (math.exp(y), math.exp(y - cls.DEVIATIONS * error),
+                math.exp(y + cls.DEVIATIONS * error))
+
+    def print_prediction(self, problem, language, time):
+        model = self.get_model(language)
+        if not model:
+            return
+        judge, low, high = self.predict(model, time)
+        limit = problem.time_limit / 1000
+        self.toolbox.console.alternate('Predicted judge time', '%.3fs' % judge,
+                                       'from', '%.3fs' % low, 'to',
+                                       '%.3fs' % high, 'for', '%.3fs' % time,
+                                       'locally, limit', '%.3fs' % limit)
+
+    def report(self, state, names):
+        points = self.get_points(
+            {name: state[name] for name in names if name in state})
+        self.toolbox.console.print('%-8s' % 'Language',
+                                   '%6s' % 'Points',
+                                   '%9s' % 'Factor',
+                                   '%8s' % 'Exponent',
+                                   '%7s' % 'Band',
+                                   bold=True,
+                                   sep='  ')
+        for language in sorted(points):
+            model = self.fit(points[language])
+            if not model:
+                self.toolbox.console.print('%-8s' % language,
+                                           '%6d' % len(points[language]),
+                                           'not enough accepted solutions',
+                                           sep='  ')
+                continue
+            self.toolbox.console.print(
+                '%-8s' % language,
+                '%6d' % model.points,
+                '%8.3fx' % math.exp(model.alpha),
+                '%8.3f' % model.beta,
+                '%6.2fx' % math.exp(self.DEVIATIONS * model.deviation),
+                sep='  ')
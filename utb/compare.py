@@ -0,0 +1,160 @@
+# utb: UVa Online Judge toolbox
+# Copyright (C) 2024-2025  Daniel Donadon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import io
+import mmap
+import os
+import re
+from collections import namedtuple
+
+Difference = namedtuple('Difference', ['line', 'column'])
+
+
+class Comparator:
+    MODES = ['exact', 'whitespace', 'token', 'float']
+    CHUNK_SIZE = 1 << 16
+    MMAP_SIZE = 1 << 24
+    TOKEN = re.compile(rb'\S+')
+
+    def __init__(self, toolbox, mode=None):
+        self.toolbox = toolbox
+        self.mode = mode or toolbox.get('compare')
+        # The external diff command only judges tests of the suite, so any
+        # other output is compared exactly in that mode
+        if self.mode == 'diff':
+            self.mode = 'exact'
+        assert self.mode in self.MODES, 'invalid comparison mode: %s' % (
+            self.mode)
+        self.tolerance = float(toolbox.get('compare-tolerance'))
+
+    def compare(self, output, answer):
+        # Both arguments may be a filename, the content itself as bytes or
+        # a binary stream. Returns the position of the first difference in
+        # the output, or None if the output matches the answer
+        with self.open(output) as found, self.open(answer) as expected:
+            # Identical outputs match in every mode, and comparing them
+            # exactly is much faster than splitting them in tokens
+            if (self.mode != 'exact' and not hasattr(output, 'read') and
+                    not hasattr(answer, 'read')):
+                if self.compare_exact(found, expected) is None:
+                    return None
+                found.seek(0)
+                expected.seek(0)
+            return getattr(self, 'compare_' + self.mode)(found, expected)
+
+    def open(self, source):
+        # Huge files are memory-mapped instead of read in chunks, and open
+        # streams such as pipes are read as they are
+        if isinstance(source, (bytes, bytearray)):
+            return io.BytesIO(source)
+        if hasattr(source, 'read'):
+            return source
+        if os.path.getsize(source) >= self.MMAP_SIZE:
+            with open(source, 'rb') as stream:
+                return mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        return open(source, 'rb', buffering=self.CHUNK_SIZE)
+
+    def compare_exact(self, found, expected):
+        line, column = 1, 1
+        while True:
+            chunk = found.read(self.CHUNK_SIZE)
+            other = expected.read(self.CHUNK_SIZE)
+            if chunk == other:
+                if not chunk:
+                    return None
+                line, column = self.advance(chunk, line, column)
+                continue
+            # The position is counted up to the first differing byte, or
+            # to the end of the shorter chunk when one extends the other
+            prefix = chunk[:self.mismatch(chunk, other)]
+            return Difference(*self.advance(prefix, line, column))
+
+    @staticmethod
+    def mismatch(chunk, other):
+        # Index of the first differing byte, found by bisecting on slices
+        # so bytes are never compared one at a time in Python
+        low, high = 0, min(len(chunk), len(other))
+        while low < high:
+            middle = (low + high + 1) // 2
+            if chunk[low:middle] == other[low:middle]:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    @staticmethod
+    def advance(data, line, column):
+        newlines = data.count(b'\n')
+        if newlines:
+            return line + newlines, len(data) - data.rindex(b'\n')
+        return line, column + len(data)
+
+    def lines(self, stream):
+        for number, line in enumerate(iter(stream.readline, b''), 1):
+            yield number, [
+                (m.group(), m.start() + 1) for m in self.TOKEN.finditer(line)
+            ]
+
+    def compare_whitespace(self, found, expected):
+        # Lines are compared ignoring the amount of whitespace between
+        # tokens, and trailing blank lines are ignored on both sides
+        found, expected = self.lines(found), self.lines(expected)
+        number = 0
+        for number, tokens in found:
+            other = next(expected, (None, None))[1]
+            if other is None:
+                if tokens:
+                    return Difference(number, tokens[0][1])
+                continue
+            for index, (token, column) in enumerate(tokens):
+                if index >= len(other) or token != other[index][0]:
+                    return Difference(number, column)
+            if len(other) > len(tokens):
+                column = tokens[-1][1] + len(tokens[-1][0]) if tokens else 1
+                return Difference(number, column)
+        for _, tokens in expected:
+            if tokens:
+                return Difference(number + 1, 1)
+        return None
+
+    def tokens(self, stream):
+        for number, tokens in self.lines(stream):
+            for token, column in tokens:
+                yield token, number, column
+
+    def compare_token(self, found, expected, match=bytes.__eq__):
+        expected = self.tokens(expected)
+        line, column = 1, 1
+        for token, line, column in self.tokens(found):
+            other = next(expected, None)
+            if other is None or not match(token, other[0]):
+                return Difference(line, column)
+            column += len(token)
+        if next(expected, None) is not None:
+            return Difference(line, column)
+        return None
+
+    def compare_float(self, found, expected):
+        return self.compare_token(found, expected, match=self.match_float)
+
+    def match_float(self, token, other):
+        if token == other:
+            return True
+        try:
+            value, reference = float(token), float(other)
+        except ValueError:
+            return False
+        return abs(value - reference) <= self.tolerance * max(1, abs(reference))
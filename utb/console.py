@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import threading
 import traceback
 
 COPYRIGHT = """utb (UVa Online Judge toolbox)
@@ -29,6 +30,10 @@ class Console:
     def __init__(self, toolbox):
         self.toolbox = toolbox
         self.accept_color = self.toolbox.get('accept-color', False)
+        # Commands hold the lock while they run, so background tasks never
+        # run along with them
+        self.lock = threading.RLock()
+        self.waiting = False
 
     def write(self, arg, color=None, bold=False, background=None):
         if (color or bold or background) and self.accept_color:
@@ -86,7 +91,8 @@ class Console:
         command = None
         try:
             command = self.toolbox.get_unique_command(argv[0])
-            self.toolbox.commands[command](*argv[1:])
+            with self.lock:
+                self.toolbox.commands[command](*argv[1:])
         except Exception as e:
             self.print('Error', bold=True, end=': ')
             if command:
@@ -96,6 +102,26 @@ class Console:
                 traceback.print_exc()
         self.print()
 
+    def prompt(self):
+        prompt = ' utb '
+        if self.toolbox.workbench.problem:
+            problem = self.toolbox.current_problem
+            status = (' ✓' if problem.history.accepted else
+                      ' ✗' if problem.history.verdict[0] is not None else '')
+            prompt = f' { problem.number }{ status } │ { prompt.strip() } '
+        if self.accept_color:
+            prompt += '░▒▓'
+        self.print(prompt, inv=True, end=' ')
+
+    def notify(self, *args):
+        # Messages of background tasks interrupt the prompt, which is shown
+        # again below them
+        if self.waiting:
+            self.print()
+        self.alternate(*args, start_bold=True)
+        if self.waiting:
+            self.prompt()
+
     def run(self):
         self.quit = False
         self.print(COPYRIGHT)
@@ -107,17 +133,11 @@ class Console:
         self.alternate('Type', 'h', 'or', 'help',
                        'for a list of available commands')
         while not self.quit:
-            prompt = ' utb '
-            if self.toolbox.workbench.problem:
-                problem = self.toolbox.current_problem
-                status = (' ✓' if problem.history.accepted else ' ✗'
-                          if problem.history.verdict[0] is not None else '')
-                prompt = f' { problem.number }{ status } │ { prompt.strip() } '
-            if self.accept_color:
-                prompt += '░▒▓'
-            self.print(prompt, inv=True, end=' ')
+            self.prompt()
             try:
+                self.waiting = True
                 line = input().strip()
+                self.waiting = False
                 self.execute(line)
             except (EOFError, KeyboardInterrupt):
                 self.print()
@@ -0,0 +1,227 @@
+# utb: UVa Online Judge toolbox
+# Copyright (C) 2024-2025  Daniel Donadon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import os
+import queue
+import shlex
+import subprocess
+import threading
+
+from .process import Usage
+
+# The server reads one request per line and forks a child for each of them.
+# The child redirects the standard streams to the files of the test case and
+# runs the source as the main module. The server reaps the child, killing it
+# when its time is over, and replies with the resources it used.
+SERVER = r'''
+import importlib, json, os, resource, runpy, signal, sys, time, traceback
+for module in sys.argv[1:]:
+    try:
+        importlib.import_module(module)
+    except ImportError:
+        pass
+requests = os.fdopen(os.dup(0), 'r')
+replies = os.fdopen(os.dup(1), 'w')
+null = os.open(os.devnull, os.O_RDWR)
+os.dup2(null, 0)
+os.dup2(null, 1)
+state = {}
+
+def expire(*args):
+    state['expired'] = True
+    try:
+        os.killpg(state['pid'], signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+def child(request):
+    signal.signal(signal.SIGALRM, signal.SIG_DFL)
+    os.setsid()
+    requests.close()
+    replies.close()
+    for key, limit in request['limits'].items():
+        resource.setrlimit(int(key), (limit, limit))
+    if request['affinity'] is not None:
+        os.sched_setaffinity(0, {request['affinity']})
+    os.chdir(request['dir'])
+    for fd, name, mode in [(0, 'input', os.O_RDONLY),
+                           (1, 'output', os.O_WRONLY | os.O_CREAT | os.O_TRUNC),
+                           (2, 'error', os.O_WRONLY | os.O_CREAT | os.O_TRUNC)]:
+        os.dup2(os.open(request[name], mode, 0o644), fd)
+    sys.stdin = sys.__stdin__ = open(0, 'r', closefd=False)
+    sys.stdout = sys.__stdout__ = open(1, 'w', closefd=False)
+    sys.stderr = sys.__stderr__ = open(2, 'w', buffering=1, closefd=False)
+    sys.argv = [request['source']]
+    sys.path[0] = os.path.dirname(os.path.abspath(request['source']))
+    code = 0
+    try:
+        runpy.run_path(request['source'], run_name='__main__')
+    except SystemExit as exit:
+        if isinstance(exit.code, int) or exit.code is None:
+            code = exit.code or 0
+        else:
+            print(exit.code, file=sys.stderr)
+            code = 1
+    except BaseException as error:
+        # Frames of the server are left out of the traceback
+        frames = error.__traceback__
+        source = request['source']
+        while frames and frames.tb_frame.f_code.co_filename != source:
+            frames = frames.tb_next
+        traceback.print_exception(type(error), error,
+                                  frames or error.__traceback__)
+        code = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except BrokenPipeError:
+        pass
+    os._exit(code)
+
+signal.signal(signal.SIGALRM, expire)
+for line in requests:
+    request = json.loads(line)
+    state = {'expired': False}
+    start = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        child(request)
+    state['pid'] = pid
+    if request['timeout']:
+        signal.setitimer(signal.ITIMER_REAL, request['timeout'])
+    _, status, usage = os.wait4(pid, 0)
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    replies.write(json.dumps([
+        -1 if state['expired'] else os.waitstatus_to_exitcode(status),
+        usage.ru_utime, usage.ru_stime, time.monotonic() - start,
+        usage.ru_maxrss, state['expired']
+    ]) + '\n')
+    replies.flush()
+'''
+
+
+class ServerPool:
+    # Each parallel job gets its own server, which is started on first use
+    # and reused while it is alive
+
+    def __init__(self, toolbox):
+        self.toolbox = toolbox
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.servers = []
+        self.startup = None
+
+    def start(self, request):
+        raise NotImplementedError()
+
+    def startup_command(self):
+        raise NotImplementedError()
+
+    def measure_startup(self):
+        if self.startup is None:
+            usage = self.toolbox.process.profile(self.startup_command())
+            self.startup = usage.user + usage.system
+        return self.startup
+
+    def acquire(self, request):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            server = self.start(request)
+            with self.lock:
+                self.servers.append(server)
+            return server
+
+    def release(self, server):
+        if server.process.poll() is None:
+            self.idle.put(server)
+        else:
+            self.discard(server)
+
+    def discard(self, server):
+        with self.lock:
+            if server in self.servers:
+                self.servers.remove(server)
+        server.process.kill()
+        server.process.wait()
+
+    def measure(self, dir, timeout=None, limits=None, affinity=None, **request):
+        request.update(dir=os.path.abspath(dir),
+                       timeout=timeout,
+                       limits=limits or {},
+                       affinity=affinity)
+        server = self.acquire(request)
+        try:
+            usage = server.run(**request)
+        except BaseException:
+            # The server may be out of step with its replies, so it is
+            # not reused
+            self.discard(server)
+            raise
+        self.release(server)
+        return usage
+
+    def close(self):
+        with self.lock:
+            for server in self.servers:
+                server.close()
+            self.servers = []
+        self.idle = queue.Queue()
+
+
+class ForkServer:
+
+    def __init__(self, interpreter, modules):
+        self.process = subprocess.Popen([interpreter, '-c', SERVER] + modules,
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL,
+                                        text=True,
+                                        start_new_session=True)
+
+    def run(self, **request):
+        try:
+            self.process.stdin.write(json.dumps(request) + '\n')
+            self.process.stdin.flush()
+            reply = self.process.stdout.readline()
+        except BrokenPipeError:
+            reply = None
+        if not reply:
+            raise Exception('fork server stopped unexpectedly')
+        return Usage(*json.loads(reply))
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+class ForkServerPool(ServerPool):
+
+    def __init__(self, toolbox):
+        super().__init__(toolbox)
+        self.interpreter = shlex.split(
+            toolbox.get_language('run', language='python'))[0]
+        self.modules = toolbox.get_language('preload', '',
+                                            language='python').split()
+
+    def start(self, request):
+        return ForkServer(self.interpreter, self.modules)
+
+    def startup_command(self):
+        # The judge starts a fresh interpreter for the solution, which costs
+        # the same as running an empty program
+        return '%s -c pass' % shlex.quote(self.interpreter)
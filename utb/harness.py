@@ -0,0 +1,289 @@
+# utb: UVa Online Judge toolbox
+# Copyright (C) 2024-2025  Daniel Donadon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import hashlib
+import os
+import resource
+import shlex
+import subprocess
+import time
+
+from .cache import identify_compiler
+from .forkserver import ServerPool
+from .process import Process, Usage
+
+# The harness reads one request per line with the directory of the classes,
+# the files of the test case, the timeout in milliseconds and the main class.
+# Each case loads the main class in a fresh class loader and runs it in its
+# own thread, replying with its exit code, CPU time, wall time, peak resident
+# set size in KB and whether it expired. An expired case cannot be stopped, so
+# the JVM halts after replying. When the solution calls System.exit, a
+# shutdown hook replies with "exit" in place of the code and the JVM exits
+# with it.
+HARNESS = r'''
+import java.io.*;
+import java.lang.management.*;
+import java.lang.reflect.*;
+import java.net.*;
+
+public class Harness {
+    static PrintStream replies;
+    static volatile Thread current;
+    static volatile long start;
+    static PrintStream out, err;
+    static final long[] time = new long[2];
+
+    public static void main(String[] args) throws Exception {
+        BufferedReader requests =
+            new BufferedReader(new InputStreamReader(System.in));
+        replies = new PrintStream(new FileOutputStream(FileDescriptor.out));
+        long stack = Long.parseLong(args[0]);
+        Runtime.getRuntime().addShutdownHook(new Thread() {
+            public void run() {
+                Thread thread = current;
+                if (thread != null) {
+                    flush();
+                    ThreadMXBean bean = ManagementFactory.getThreadMXBean();
+                    reply("exit", bean.getThreadCpuTime(thread.getId()),
+                          bean.getThreadUserTime(thread.getId()), false);
+                }
+            }
+        });
+        String line;
+        while ((line = requests.readLine()) != null) {
+            String[] request = line.split("\t");
+            File dir = new File(request[0]);
+            long timeout = Long.parseLong(request[4]);
+            final String name = request[5];
+            System.setIn(new BufferedInputStream(
+                new FileInputStream(new File(dir, request[1]))));
+            out = new PrintStream(new BufferedOutputStream(
+                new FileOutputStream(new File(dir, request[2])), 1 << 16));
+            err = new PrintStream(
+                new FileOutputStream(new File(dir, request[3])), true);
+            System.setOut(out);
+            System.setErr(err);
+            final URLClassLoader loader = new URLClassLoader(
+                new URL[] {dir.toURI().toURL()},
+                ClassLoader.getSystemClassLoader().getParent());
+            final int[] code = {0};
+            Runnable task = new Runnable() {
+                public void run() {
+                    try {
+                        Method main = loader.loadClass(name).getMethod(
+                            "main", String[].class);
+                        // Main is usually package-private, and its loader
+                        // makes its package differ from the harness
+                        main.setAccessible(true);
+                        main.invoke(null, (Object) new String[0]);
+                    } catch (Throwable e) {
+                        if (e instanceof InvocationTargetException) {
+                            e = e.getCause();
+                            trim(e);
+                        }
+                        err.print("Exception in thread \"main\" ");
+                        e.printStackTrace(err);
+                        code[0] = 1;
+                    }
+                    ThreadMXBean bean = ManagementFactory.getThreadMXBean();
+                    time[0] = bean.getCurrentThreadCpuTime();
+                    time[1] = bean.getCurrentThreadUserTime();
+                }
+            };
+            resetPeakResident();
+            Thread thread = new Thread(null, task, "main", stack);
+            start = System.nanoTime();
+            current = thread;
+            thread.start();
+            thread.join(timeout);
+            if (thread.isAlive()) {
+                current = null;
+                flush();
+                ThreadMXBean bean = ManagementFactory.getThreadMXBean();
+                reply("-1", bean.getThreadCpuTime(thread.getId()),
+                      bean.getThreadUserTime(thread.getId()), true);
+                Runtime.getRuntime().halt(0);
+            }
+            current = null;
+            flush();
+            reply(String.valueOf(code[0]), time[0], time[1], false);
+            out.close();
+            err.close();
+            System.in.close();
+            loader.close();
+        }
+    }
+
+    static void flush() {
+        out.flush();
+        err.flush();
+    }
+
+    static void trim(Throwable e) {
+        // Frames of the harness and of reflection are left out
+        StackTraceElement[] frames = e.getStackTrace();
+        int end = frames.length;
+        while (end > 0 && frames[end - 1].getClassName().matches(
+                   "(Harness|java\\.|jdk\\.|sun\\.).*")) {
+            end--;
+        }
+        if (end > 0) {
+            StackTraceElement[] kept = new StackTraceElement[end];
+            System.arraycopy(frames, 0, kept, 0, end);
+            e.setStackTrace(kept);
+        }
+    }
+
+    static void resetPeakResident() {
+        // Memory left by previous cases is collected and returned to the
+        // system, then writing 5 to clear_refs resets the peak resident set
+        // size to the current one
+        System.gc();
+        try {
+            FileOutputStream refs =
+                new FileOutputStream("/proc/self/clear_refs");
+            try {
+                refs.write('5');
+            } finally {
+                refs.close();
+            }
+        } catch (IOException e) {
+        }
+    }
+
+    static long peakResident() {
+        // Peak resident set size of the JVM in KB, as reported for every
+        // other run, since the start of the case
+        try {
+            BufferedReader status =
+                new BufferedReader(new FileReader("/proc/self/status"));
+            try {
+                String line;
+                while ((line = status.readLine()) != null) {
+                    if (line.startsWith("VmHWM:")) {
+                        return Long.parseLong(
+                            line.replaceAll("[^0-9]", ""));
+                    }
+                }
+            } finally {
+                status.close();
+            }
+        } catch (IOException e) {
+        }
+        return 0;
+    }
+
+    static void reply(String code, long cpu, long user, boolean expired) {
+        // The CPU and user times are not read at once, so their difference
+        // may be slightly negative
+        replies.println(code + " " + user / 1e9 + " " +
+                        Math.max(0, cpu - user) / 1e9 + " " +
+                        (System.nanoTime() - start) / 1e9 + " " +
+                        peakResident() + " " + expired);
+        replies.flush();
+    }
+}
+'''
+
+
+class JavaHarness:
+
+    def __init__(self, java, classpath, stack, limits, options):
+        # The limits are applied by the shell, which is then replaced by
+        # the JVM
+        self.process = subprocess.Popen([
+            '/bin/sh', '-c',
+            Process.confine(limits, None) + 'exec "$@"', 'sh', java
+        ] + options + ['-cp', classpath, 'Harness',
+                       str(stack)],
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL,
+                                        text=True,
+                                        start_new_session=True)
+
+    def run(self, dir, input, output, error, exe, timeout=None, **kwargs):
+        name = os.path.splitext(exe)[0]
+        timeout = int(timeout * 1000) if timeout else 0
+        start = time.monotonic()
+        try:
+            self.process.stdin.write(
+                '\t'.join([dir, input, output, error,
+                           str(timeout), name]) + '\n')
+            self.process.stdin.flush()
+            reply = self.process.stdout.readline().split()
+        except BrokenPipeError:
+            reply = None
+        if not reply or reply[0] == 'exit':
+            # The JVM ended with the solution, either through System.exit
+            # or killed by a signal such as the one of the output limit
+            code = self.process.wait()
+            if not reply:
+                return Usage(code, 0, 0, time.monotonic() - start, 0, False)
+            reply[0] = code
+        if reply[-1] == 'true':
+            self.process.wait()
+        return Usage(int(reply[0]), float(reply[1]), float(reply[2]),
+                     float(reply[3]), int(reply[4]), reply[5] == 'true')
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+class JavaHarnessPool(ServerPool):
+
+    def __init__(self, toolbox):
+        super().__init__(toolbox)
+        self.java = shlex.split(toolbox.get_language('run', language='java'))[0]
+        self.javac = shlex.split(
+            toolbox.get_language('compile', language='java'))[0]
+        self.classpath = self.compile()
+
+    def compile(self):
+        # The harness is compiled once for each version of its source and
+        # of the compiler
+        digest = hashlib.sha256()
+        digest.update(HARNESS.encode())
+        digest.update(identify_compiler(self.javac))
+        dir = os.path.join(self.toolbox.get('data-dir'), 'harness',
+                           digest.hexdigest())
+        if not os.path.isfile(os.path.join(dir, 'Harness.class')):
+            os.makedirs(dir, exist_ok=True)
+            with open(os.path.join(dir, 'Harness.java'), 'w') as stream:
+                stream.write(HARNESS)
+            command = '%s -source 8 -target 8 -Xlint:-options Harness.java'
+            code = self.toolbox.process.execute(command %
+                                                shlex.quote(self.javac),
+                                                dir=dir,
+                                                echo=False)
+            assert code == 0, 'could not compile the Java harness'
+        return os.path.abspath(dir)
+
+    def start(self, request):
+        # The heap of the JVM is bounded by the memory limit, while the
+        # stack limit sets the size of the thread running each case
+        limits = dict(request['limits'])
+        stack = limits.pop(resource.RLIMIT_STACK, 0)
+        memory = self.toolbox.get('memory-limit')
+        options = ['-Xmx%dm' % memory] if memory else []
+        return JavaHarness(self.java, self.classpath, stack, limits, options)
+
+    def startup_command(self):
+        # Starting the harness with no requests costs as much as starting
+        # the JVM and loading a class
+        return '%s -cp %s Harness 0' % (shlex.quote(
+            self.java), shlex.quote(self.classpath))
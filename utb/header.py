@@ -0,0 +1,135 @@
+# utb: UVa Online Judge toolbox
+# Copyright (C) 2024-2025  Daniel Donadon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import hashlib
+import os
+import re
+import shlex
+import threading
+import time
+
+from .cache import identify_compiler
+
+
+class PrecompiledHeader:
+    HEADER_TYPES = {'c': 'c-header', 'c99': 'c-header', 'cpp': 'c++-header'}
+    COMPILERS = ['gcc', 'g++', 'cc', 'c++']
+    INCLUDE = re.compile(r'^\s*#\s*include\s*<([^>]+)>', re.MULTILINE)
+    DEFINE = re.compile(r'^\s*#\s*(define|undef)', re.MULTILINE)
+
+    def __init__(self, toolbox):
+        self.toolbox = toolbox
+        self.base_dir = os.path.join(toolbox.get('data-dir'), 'pch')
+        # Parallel compilations wait for the header instead of building it
+        # at the same time
+        self.lock = threading.Lock()
+
+    def split_command(self, language):
+        tokens = shlex.split(
+            self.toolbox.get_language('compile', language=language))
+        compiler, flags = tokens[0], []
+        tokens = iter(tokens[1:])
+        for token in tokens:
+            if token == '-o':
+                next(tokens, None)
+            elif '{' not in token and not token.startswith(('-l', '-L')):
+                flags.append(token)
+        return compiler, flags
+
+    def is_supported(self, compiler):
+        name = os.path.basename(compiler)
+        return any(
+            name == c or name.startswith(c + '-') for c in self.COMPILERS)
+
+    def prepare(self, source_path, language, echo=True):
+        # A header is only used when the source includes by itself all the
+        # headers from the template before defining any macro, so it has no
+        # effect other than speeding up the compilation. A macro defined
+        # between the headers would change the ones included after it
+        if (not self.toolbox.get('precompiled-headers') or
+                language not in self.HEADER_TYPES):
+            return None
+        compiler, flags = self.split_command(language)
+        headers = self.INCLUDE.findall(
+            self.toolbox.get_language('template', '', language=language))
+        if not self.is_supported(compiler) or not headers:
+            return None
+        with open(source_path) as stream:
+            source = stream.read()
+        includes = [
+            m for m in self.INCLUDE.finditer(source) if m.group(1) in headers
+        ]
+        if (set(headers) != set(m.group(1) for m in includes) or
+                self.DEFINE.search(source, 0, includes[-1].start())):
+            return None
+        digest = hashlib.sha256()
+        digest.update(identify_compiler(compiler))
+        digest.update(' '.join(flags + headers).encode())
+        dir = os.path.join(self.base_dir, digest.hexdigest())
+        header = os.path.abspath(os.path.join(dir, 'pch.h'))
+        with self.lock:
+            info = self.toolbox.read_json(os.path.join(dir, 'info.json'))
+            if info is None or not (info['failed'] or
+                                    os.path.isfile(header + '.gch')):
+                info = self.build(compiler, flags, headers, language, dir,
+                                  header, echo)
+        return None if info['failed'] else (header, info)
+
+    def build(self, compiler, flags, headers, language, dir, header, echo):
+        os.makedirs(dir, exist_ok=True)
+        with open(header, 'w') as stream:
+            stream.writelines(f'#include <{ h }>\n' for h in headers)
+        command = ' '.join(
+            [shlex.quote(compiler), '-x', self.HEADER_TYPES[language]] +
+            [shlex.quote(flag) for flag in flags] + ['pch.h'])
+        if echo:
+            self.toolbox.console.print('Building precompiled header')
+        code = self.toolbox.process.execute(command + ' -o pch.h.gch',
+                                            dir=dir,
+                                            echo=echo)
+        # The time spent parsing the headers is what a compilation saves
+        start = time.monotonic()
+        if code == 0:
+            self.toolbox.process.execute(command + ' -fsyntax-only',
+                                         dir=dir,
+                                         echo=False)
+        info = {
+            'failed': code != 0,
+            'parse': time.monotonic() - start,
+            'saved': 0
+        }
+        self.save(dir, info)
+        return info
+
+    def save(self, dir, info):
+        self.toolbox.write_json(os.path.join(dir, 'info.json'), info)
+
+    def command(self, header, language, **kwargs):
+        compiler, rest = self.toolbox.get_language('compile',
+                                                   language=language).split(
+                                                       None, 1)
+        return ' '.join([
+            compiler, '-include',
+            shlex.quote(header), '-Winvalid-pch',
+            rest.format(dir='.', **kwargs)
+        ])
+
+    def report(self, header, info):
+        info['saved'] += info['parse']
+        self.save(os.path.dirname(header), info)
+        self.toolbox.console.alternate('Precompiled header saved about',
+                                       '%.2fs' % info['parse'],
+                                       '(%.1fs in total)' % info['saved'])
@@ -0,0 +1,128 @@
+# utb: UVa Online Judge toolbox
+# Copyright (C) 2024-2025  Daniel Donadon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import datetime
+import math
+import os
+import time
+
+
+class TestHistory:
+    # The runs of each test case of a problem, oldest first, which are used
+    # to schedule the next run and to find performance regressions. A run
+    # is kept as its time, the hash of the source, whether it passed, its
+    # CPU time in seconds, its peak memory in KB and the language of the
+    # source
+    MIN_TIME = 0.01  # seconds, faster runs are mostly noise
+    MIN_MEMORY = 4096  # KB, smaller increases are mostly noise
+
+    def __init__(self, toolbox):
+        self.toolbox = toolbox
+        self.base_dir = os.path.join(toolbox.get('data-dir'), 'history')
+        self.size = toolbox.get('history-size')
+
+    def filename(self, problem):
+        return os.path.join(self.base_dir, '%d.json' % problem.number)
+
+    def load(self, problem):
+        history = self.toolbox.read_json(self.filename(problem), default={})
+        return {
+            test: runs
+            for test, runs in history.items()
+            if isinstance(runs, list)
+        }
+
+    def record(self, problem, source, language, results):
+        # Results map test cases to their outcome and usage
+        history = self.load(problem)
+        now = int(time.time())
+        for test, (passed, usage) in results.items():
+            runs = history.setdefault(test, [])
+            runs.append([
+                now, source, passed,
+                round(usage.user + usage.system, 3), usage.memory, language
+            ])
+            del runs[:-self.size]
+        self.toolbox.write_json(self.filename(problem), history)
+
+    def regressions(self, problem, language, results):
+        # Yields the tests that passed but were slower or used more memory
+        # than the best previous run in the same language by more than the
+        # threshold. Runs recorded without their language are not compared
+        history = self.load(problem)
+        threshold = self.toolbox.get('history-threshold')
+        for test, (passed, usage) in results.items():
+            runs = [
+                run for run in history.get(test, [])
+                if run[2] and run[5:] == [language]
+            ]
+            if not passed or not runs:
+                continue
+            cpu = usage.user + usage.system
+            best = min(run[3] for run in runs)
+            if cpu >= self.MIN_TIME and cpu > threshold * max(
+                    best, self.MIN_TIME):
+                yield test, 'time', '%.3fs' % cpu, '%.3fs' % best
+            best = min(run[4] for run in runs)
+            if (usage.memory > threshold * best and
+                    usage.memory - best > self.MIN_MEMORY):
+                yield (test, 'memory', '%.1f MB' % (usage.memory / 1024),
+                       '%.1f MB' % (best / 1024))
+
+    def schedule(self, problem, tests, jobs):
+        # Tests that failed last time run first. Parallel runs then start
+        # with the longest tests, so no long test is left running alone at
+        # the end, and tests never run before count as the longest
+        history = self.load(problem)
+
+        def priority(test):
+            runs = history.get(test)
+            last = runs[-1] if runs else [0, None, True, math.inf, 0]
+            return (1 if last[2] else 0, -last[3] if jobs > 1 else 0)
+
+        return sorted(tests, key=lambda test: (priority(test), test))
+
+    def trend(self, problem, *tests):
+        history = self.load(problem)
+        for test in tests:
+            if test not in history:
+                raise Exception(f'test case has no history: { test }')
+        tests = tests if tests else sorted(history)
+        if not tests:
+            self.toolbox.console.print('There is no history of test runs')
+            return
+        limit = problem.time_limit / 1000
+        self.toolbox.console.alternate('Time limit', '%.3fs' % limit,
+                                       ' Runs kept per test', self.size)
+        for test in tests:
+            runs = history[test]
+            self.toolbox.console.print(test, bold=True)
+            best = min((run[3] for run in runs if run[2]), default=None)
+            maximum = max(limit, max(run[3] for run in runs))
+            for date, source, passed, cpu, memory, *language in runs:
+                date = datetime.datetime.fromtimestamp(date)
+                self.toolbox.console.print(
+                    ' ',
+                    date.strftime('%Y-%m-%d %H:%M'),
+                    source[:8] if source else '-' * 8,
+                    '%-6s' % (language[0] if language else '-'),
+                    '%6.3fs' % cpu,
+                    '%6.1f MB' % (memory / 1024),
+                    'Best' if cpu == best else 'Okay' if passed else 'Fail',
+                    sep='  ',
+                    end='  ')
+                self.toolbox.console.bar(cpu, maximum, 20, bold=not passed)
+                self.toolbox.console.print()
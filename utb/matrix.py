@@ -0,0 +1,174 @@
+# utb: UVa Online Judge toolbox
+# Copyright (C) 2024-2025  Daniel Donadon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from .compare import Comparator
+from .program import Program
+from .submission import Submission
+
+
+class Matrix:
+    # Every solution of the problem, one for each language whose source is
+    # found in the problem directory, is built in its own directory, since
+    # languages may share the name of the executable
+    scratch_dir = '.matrix'
+
+    def __init__(self, workbench):
+        self.toolbox = workbench.toolbox
+        self.workbench = workbench
+        self.problem = workbench.problem
+        self.dir = workbench.dir()
+        self.scratch = os.path.abspath(os.path.join(self.dir, self.scratch_dir))
+
+    def find(self):
+        kwargs = self.toolbox.account.as_kwargs()
+        kwargs.update(self.problem.as_kwargs())
+        programs = {}
+        for language in self.toolbox.get_languages():
+            source = self.toolbox.get_language('source', language=language)
+            path = os.path.join(self.dir, source.format(**kwargs))
+            if os.path.isfile(path):
+                programs[language] = Program(self.toolbox,
+                                             path,
+                                             dir=os.path.join(
+                                                 self.dir, self.scratch_dir,
+                                                 language),
+                                             language=language,
+                                             problem=self.problem)
+        return programs
+
+    def get_filename(self, language, test, extension):
+        return os.path.join(self.scratch, 'runs', language,
+                            f'{ test }.{ extension }')
+
+    def execute(self, language, test):
+        program = self.programs[language]
+        files = {
+            extension: self.get_filename(language, test, extension)
+            for extension in ['out', 'err']
+        }
+        command = program.command(input=os.path.abspath(
+            self.workbench.get_filename(f'{ test }.in')),
+                                  output=files['out'],
+                                  error=files['err'])
+        usage = self.toolbox.process.profile(
+            command,
+            dir=program.dir,
+            timeout=self.problem.time_limit / 1000,
+            limits=self.workbench.get_limits(language))
+        result = {'usage': usage, 'difference': None, 'stderr': False}
+        result['verdict'] = self.workbench.get_verdict(usage, files['err'])
+        if result['verdict'] is None and self.testcases[test]:
+            result['verdict'] = (90 if self.workbench.check_answer(
+                result, files['out'], f'{ test }.ans', input=f'{ test }.in')
+                                 else 70)
+        return language, test, result
+
+    def cross_check(self, test):
+        # Outputs of the languages that ran to completion, even with a wrong
+        # answer, are compared with the first of them
+        comparator = Comparator(self.toolbox)
+        languages = [
+            language for language in self.programs
+            if self.results[language, test]['verdict'] in [None, 70, 90]
+        ]
+        return [
+            language for language in languages[1:] if comparator.compare(
+                self.get_filename(language, test, 'out'),
+                self.get_filename(languages[0], test, 'out')) is not None
+        ]
+
+    def run(self, jobs=None):
+        self.programs = self.find()
+        assert self.programs, 'there are no sources of the problem'
+        self.testcases = {
+            test: has_answer
+            for test, has_answer in self.workbench.get_testcases().items()
+            if os.path.isfile(self.workbench.get_filename(f'{ test }.in'))
+        }
+        jobs = max(1, jobs or self.toolbox.get('test-jobs') or 1)
+        self.toolbox.console.alternate('Languages',
+                                       ', '.join(self.programs), ' Tests',
+                                       len(self.testcases), ' Parallel jobs',
+                                       jobs)
+        for language in self.programs:
+            os.makedirs(os.path.join(self.scratch, 'runs', language),
+                        exist_ok=True)
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                built = dict(
+                    zip(
+                        self.programs,
+                        executor.map(
+                            lambda program: program.compile(quiet=True),
+                            self.programs.values())))
+                for language, success in built.items():
+                    if not success:
+                        self.toolbox.console.alternate('Compilation failed for',
+                                                       language)
+                        del self.programs[language]
+                pairs = [(language, test)
+                         for test in sorted(self.testcases)
+                         for language in self.programs]
+                self.results = {
+                    (language, test): result
+                    for language, test, result in executor.map(
+                        lambda pair: self.execute(*pair), pairs)
+                }
+                self.report()
+        finally:
+            shutil.rmtree(os.path.join(self.scratch, 'runs'),
+                          ignore_errors=True)
+
+    def report(self):
+        tests = sorted(self.testcases)
+        width = max([4] + [len(test) for test in tests])
+        self.toolbox.console.print(
+            '%-*s' % (width, 'Test'),
+            *['%-22s' % language for language in self.programs],
+            'Outputs',
+            bold=True,
+            sep='  ')
+        totals = {language: [0, 0] for language in self.programs}
+        for test in tests:
+            cells = []
+            for language in self.programs:
+                result = self.results[language, test]
+                usage, verdict = result['usage'], result['verdict']
+                time = usage.user + usage.system
+                totals[language][0] += time
+                totals[language][1] = max(totals[language][1], usage.memory)
+                cells.append('%-2s  %6.3fs  %6.1f MB' %
+                             ('--' if verdict is None else
+                              Submission.VERDICT_CODES[verdict][0], time,
+                              usage.memory / 1024))
+            differ = self.cross_check(test)
+            self.toolbox.console.print('%-*s' % (width, test),
+                                       *cells,
+                                       'differ: ' +
+                                       ', '.join(differ) if differ else 'same',
+                                       sep='  ')
+        self.toolbox.console.print('%-*s' % (width, 'All'),
+                                   *[
+                                       '    %6.3fs  %6.1f MB' %
+                                       (time, memory / 1024)
+                                       for time, memory in totals.values()
+                                   ],
+                                   bold=True,
+                                   sep='  ')
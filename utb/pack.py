@@ -0,0 +1,175 @@
+# utb: UVa Online Judge toolbox
+# Copyright (C) 2024-2025  Daniel Donadon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import hashlib
+import os
+import re
+import sqlite3
+import time
+import zlib
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS solutions (
+    number INTEGER NOT NULL,
+    language TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    date INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    source BLOB NOT NULL,
+    tests BLOB,
+    PRIMARY KEY (number, language)
+);
+CREATE INDEX IF NOT EXISTS solutions_hash ON solutions (hash);
+'''
+
+
+class SolutionPack:
+    # Archived solutions may be packed in a single SQLite file instead of
+    # one file for each solution. Sources are compressed and tests are kept
+    # as the zip archive written by `archive`. Solutions are indexed by
+    # problem number and language, so a solution replaces the previous one
+    # in the same language, and by the hash of the source
+
+    NUMBER = re.compile(r'^(\d+)')
+
+    def __init__(self, toolbox):
+        self.toolbox = toolbox
+        filename = toolbox.get('solution-pack')
+        self.filename = (os.path.join(toolbox.get('solution-dir'), filename)
+                         if filename else None)
+
+    @property
+    def enabled(self):
+        return self.filename is not None
+
+    def connect(self):
+        self.toolbox.makedir(self.filename)
+        connection = sqlite3.connect(self.filename)
+        connection.executescript(SCHEMA)
+        return connection
+
+    def put(self, number, language, filename, source, tests=None):
+        # Returns whether the source differs from the packed one
+        digest = hashlib.sha256(source).hexdigest()
+        with self.connect() as connection:
+            row = connection.execute(
+                'SELECT hash FROM solutions WHERE number = ? AND language = ?',
+                (number, language)).fetchone()
+            connection.execute(
+                'INSERT OR REPLACE INTO solutions '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (number, language, filename, digest, int(
+                    time.time()), len(source), zlib.compress(source, 9), tests))
+        connection.close()
+        return row is None or row[0] != digest
+
+    def entries(self, volumes=()):
+        # Yields the number, language, filename, hash, date and size of the
+        # packed solutions, reading only the index
+        query = ('SELECT number, language, filename, hash, date, size '
+                 'FROM solutions')
+        if volumes:
+            query += ' WHERE number / 100 IN (%s)' % ', '.join(
+                '?' * len(volumes))
+        if not os.path.isfile(self.filename):
+            return
+        connection = self.connect()
+        try:
+            yield from connection.execute(query + ' ORDER BY number, language',
+                                          volumes)
+        finally:
+            connection.close()
+
+    def read(self, number, language):
+        # Returns the filename, the source and the archive of tests
+        connection = self.connect()
+        try:
+            filename, source, tests = connection.execute(
+                'SELECT filename, source, tests FROM solutions '
+                'WHERE number = ? AND language = ?',
+                (number, language)).fetchone()
+        finally:
+            connection.close()
+        return filename, zlib.decompress(source), tests
+
+    def list(self, volumes=()):
+        count = 0
+        for number, language, filename, digest, date, size in self.entries(
+                volumes):
+            date = time.strftime('%Y-%m-%d', time.localtime(date))
+            self.toolbox.console.print('%6d' % number,
+                                       '%-8s' % language,
+                                       '%-16s' % filename,
+                                       digest[:8],
+                                       date,
+                                       '%7d B' % size,
+                                       sep='  ')
+            count += 1
+        self.toolbox.console.alternate('Solutions packed', count)
+
+    def extract(self, volumes=(), dir=None):
+        # Solutions are written in the layout of the solution directory
+        dir = dir or self.toolbox.get('solution-dir')
+        count = 0
+        for number, language, *_ in list(self.entries(volumes)):
+            filename, source, tests = self.read(number, language)
+            target = dir
+            if self.toolbox.get('use-volume-in-solution-dir'):
+                target = os.path.join(dir, str(number // 100))
+            os.makedirs(target, exist_ok=True)
+            with open(os.path.join(target, filename), 'wb') as stream:
+                stream.write(source)
+            if tests:
+                with open(os.path.join(target, '%d.tests.zip' % number),
+                          'wb') as stream:
+                    stream.write(tests)
+            count += 1
+        self.toolbox.console.alternate('Solutions extracted', count, 'to', dir)
+
+    def add(self, volumes=()):
+        # Solutions saved in the solution directory are packed, keeping
+        # their files, which may be removed afterwards
+        languages = self.toolbox.get_languages()
+        count = 0
+        for dir, _, filenames in sorted(
+                os.walk(self.toolbox.get('solution-dir'))):
+            for filename in sorted(filenames):
+                match = self.NUMBER.match(filename)
+                problem = match and self.toolbox.problemset.list.get(
+                    int(match.group(1)))
+                if not problem or volumes and problem.volume not in volumes:
+                    continue
+                kwargs = self.toolbox.account.as_kwargs()
+                kwargs.update(problem.as_kwargs())
+                language = next(
+                    (language for language in languages
+                     if self.toolbox.get_language('source', language=language).
+                     format(**kwargs) == filename), None)
+                if not language:
+                    continue
+                with open(os.path.join(dir, filename), 'rb') as stream:
+                    source = stream.read()
+                tests = os.path.join(dir, '%d.tests.zip' % problem.number)
+                if os.path.isfile(tests):
+                    with open(tests, 'rb') as stream:
+                        tests = stream.read()
+                else:
+                    tests = None
+                self.put(problem.number, language, filename, source, tests)
+                count += 1
+        self.toolbox.console.alternate('Solutions packed', count, 'in',
+                                       self.filename)
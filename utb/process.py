@@ -14,16 +14,39 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import ctypes
 import os
+import resource
+import selectors
 import shlex
 import signal
 import subprocess
+import threading
+import time
+from collections import namedtuple
+
+PR_SET_CHILD_SUBREAPER = 36
+
+# Option of the shell builtin ulimit for each resource, and its unit in
+# bytes, since /bin/sh counts the file size in blocks of 512 bytes
+LIMIT_OPTIONS = {
+    resource.RLIMIT_AS: ('-v', 1024),
+    resource.RLIMIT_STACK: ('-s', 1024),
+    resource.RLIMIT_FSIZE: ('-f', 512),
+}
+
+Usage = namedtuple('Usage',
+                   ['code', 'user', 'system', 'wall', 'memory', 'timeout'])
 
 
 class Process:
 
     def __init__(self, toolbox):
         self.toolbox = toolbox
+        self.reaper = self.set_subreaper()
+        # Process groups of the commands being profiled or executed, so they
+        # can all be killed when the user interrupts a run
+        self.groups = set()
 
     def open(self, command, *args, **kwargs):
         command = self.toolbox.get(command).format(*args, **kwargs)
@@ -33,6 +56,17 @@ class Process:
                                    stdout=subprocess.DEVNULL,
                                    stderr=subprocess.DEVNULL)
 
+    def expand(self, command, *args, language=False, **kwargs):
+        # Commands always run inside their working directory. The language
+        # may be either a flag to use the current language or its name
+        if language:
+            command = self.toolbox.get_language(
+                command, language=None if language is True else language)
+        else:
+            command = self.toolbox.get(command)
+        kwargs.setdefault('dir', '.')
+        return command.format(*args, **kwargs)
+
     def run(self,
             command,
             *args,
@@ -42,25 +76,34 @@ class Process:
             timeout=None,
             language=False,
             **kwargs):
-        method = 'get_language' if language else 'get'
-        command = getattr(self.toolbox, method)(command).format(*args, **kwargs)
+        command = self.expand(command, *args, language=language, **kwargs)
+        return self.execute(command,
+                            dir=dir,
+                            echo=echo,
+                            shell=shell,
+                            timeout=timeout)
+
+    def execute(self, command, dir=None, echo=True, shell=True, timeout=None):
         if echo:
             self.toolbox.console.alternate('Executing', command)
         output = subprocess.PIPE if echo else subprocess.DEVNULL
+        process = subprocess.Popen(command,
+                                   shell=shell,
+                                   stdout=output,
+                                   stderr=subprocess.STDOUT,
+                                   text=True,
+                                   cwd=dir,
+                                   start_new_session=True)
+        self.groups.add(process.pid)
         try:
-            process = subprocess.Popen(command,
-                                       shell=shell,
-                                       stdout=output,
-                                       stderr=subprocess.STDOUT,
-                                       text=True,
-                                       cwd=dir,
-                                       preexec_fn=os.setsid)
             output, errors = process.communicate(timeout=timeout)
         except subprocess.TimeoutExpired:
             os.killpg(os.getpgid(process.pid), signal.SIGKILL)
             if echo:
                 self.toolbox.console.print('Timeout expired')
             return -1
+        finally:
+            self.groups.discard(process.pid)
         if echo:
             if output:
                 self.toolbox.console.write(output)
@@ -70,3 +113,243 @@ class Process:
                 self.toolbox.console.print('Command ended with error status',
                                            bold=True)
         return process.returncode
+
+    def measure(self,
+                command,
+                *args,
+                dir=None,
+                timeout=None,
+                limits=None,
+                affinity=None,
+                pass_fds=(),
+                language=False,
+                **kwargs):
+        command = self.expand(command, *args, language=language, **kwargs)
+        return self.profile(command,
+                            dir=dir,
+                            timeout=timeout,
+                            limits=limits,
+                            affinity=affinity,
+                            pass_fds=pass_fds)
+
+    def pipe(self,
+             command,
+             data,
+             *args,
+             dir=None,
+             timeout=None,
+             limits=None,
+             affinity=None,
+             capacity=None,
+             language=False,
+             **kwargs):
+        # Like measure, but the input, output and error of the command are
+        # pipes instead of files. The input is either fed from memory or read
+        # by the command from a given descriptor. Both the output and the
+        # error are captured up to the given capacity in bytes, beyond which
+        # the command is killed as if it exceeded the output limit. Returns
+        # the usage, the output and the error
+        pipes = [os.pipe() for _ in range(3)]
+        if isinstance(data, int):
+            os.close(pipes[0][0])
+            os.close(pipes[0][1])
+            pipes[0], data = (data, None), None
+        ends = [pipes[0][0], pipes[1][1], pipes[2][1]]
+        names = ['/proc/self/fd/%d' % fd for fd in ends]
+        command = self.expand(command,
+                              *args,
+                              language=language,
+                              input=names[0],
+                              output=names[1],
+                              error=names[2],
+                              **kwargs)
+        buffers = {pipes[1][0]: bytearray(), pipes[2][0]: bytearray()}
+        state = {'overflow': False}
+        threads = []
+
+        def monitor(group):
+            for fd in ends[1:] if pipes[0][1] is None else ends:
+                os.close(fd)
+            thread = threading.Thread(target=self.transfer,
+                                      args=(group, pipes[0][1], buffers, data,
+                                            capacity, state))
+            thread.start()
+            threads.append(thread)
+
+        try:
+            usage = self.profile(command,
+                                 dir=dir,
+                                 timeout=timeout,
+                                 limits=limits,
+                                 affinity=affinity,
+                                 pass_fds=ends,
+                                 monitor=monitor)
+        finally:
+            for thread in threads:
+                thread.join()
+        if state['overflow'] and not usage.timeout:
+            usage = usage._replace(code=-signal.SIGXFSZ)
+        return (usage, bytes(buffers[pipes[1][0]]), bytes(buffers[pipes[2][0]]))
+
+    @staticmethod
+    def transfer(group, writer, buffers, data, capacity, state):
+        selector = selectors.DefaultSelector()
+        if data:
+            os.set_blocking(writer, False)
+            selector.register(writer, selectors.EVENT_WRITE)
+        elif writer is not None:
+            os.close(writer)
+        for reader in buffers:
+            selector.register(reader, selectors.EVENT_READ)
+        data, offset = memoryview(data or b''), 0
+        while selector.get_map():
+            for key, _ in selector.select():
+                if key.fd == writer:
+                    try:
+                        offset += os.write(writer, data[offset:offset + 65536])
+                    except BrokenPipeError:
+                        offset = len(data)
+                    if offset >= len(data):
+                        selector.unregister(writer)
+                        os.close(writer)
+                    continue
+                chunk = os.read(key.fd, 65536)
+                if not chunk:
+                    selector.unregister(key.fd)
+                    os.close(key.fd)
+                    continue
+                buffer = buffers[key.fd]
+                buffer += chunk
+                if capacity and len(buffer) > capacity:
+                    del buffer[capacity:]
+                    if not state['overflow']:
+                        state['overflow'] = True
+                        try:
+                            os.killpg(group, signal.SIGKILL)
+                        except ProcessLookupError:
+                            pass
+        selector.close()
+
+    def profile(self,
+                command,
+                dir=None,
+                timeout=None,
+                limits=None,
+                affinity=None,
+                pass_fds=(),
+                monitor=None):
+        # Run a command without echoing and measure its resources as reported
+        # by the kernel when it is reaped. Times are in seconds and memory
+        # (peak RSS) is in KB. Resource limits are given as a dictionary
+        # mapping each resource to its limit, and the command may be pinned
+        # to a single CPU given by its number. Descriptors may be passed to
+        # the command, and the monitor is called with its process group once
+        # it is started
+        reader, writer = os.pipe() if self.reaper else (None, None)
+        if self.reaper:
+            # The command is started in background by the shell, which exits
+            # right away reporting its pid. The command is then reparented to
+            # this process and is not a fork of the interpreter, whose
+            # resident memory would count as its own peak RSS. The pipe is
+            # reached through procfs since the shell may not accept its
+            # descriptor number in a redirection. The shell is replaced by
+            # echo so it never reaps a command that ends too soon
+            command = '%s & exec echo $! > /proc/self/fd/%d' % (command, writer)
+        command = self.confine(limits, affinity) + command
+        start = time.monotonic()
+        shell = subprocess.Popen(command,
+                                 shell=True,
+                                 stdin=subprocess.DEVNULL,
+                                 stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.DEVNULL,
+                                 cwd=dir,
+                                 pass_fds=tuple(pass_fds) +
+                                 ((writer,) if writer else ()),
+                                 start_new_session=True)
+        pid = shell.pid
+        self.groups.add(shell.pid)
+        if monitor:
+            monitor(shell.pid)
+        if self.reaper:
+            os.close(writer)
+            with os.fdopen(reader) as stream:
+                pid = stream.readline().strip()
+            if shell.wait() != 0 or not pid:
+                self.groups.discard(shell.pid)
+                return Usage(shell.returncode or 1, 0, 0,
+                             time.monotonic() - start, 0, False)
+            pid = int(pid)
+        lock = threading.Lock()
+        state = {'running': True, 'expired': False}
+
+        def kill():
+            # The command may end while the timer fires, before it is marked
+            # as finished, so it only expires when it was still running and
+            # killing it succeeded
+            with lock:
+                if not state['running']:
+                    return
+                try:
+                    if os.waitid(os.P_PID, pid,
+                                 os.WEXITED | os.WNOHANG | os.WNOWAIT):
+                        return
+                    os.killpg(shell.pid, signal.SIGKILL)
+                except (ChildProcessError, ProcessLookupError):
+                    return
+                state['expired'] = True
+
+        timer = threading.Timer(timeout, kill) if timeout else None
+        if timer:
+            timer.start()
+        _, status, usage = os.wait4(pid, 0)
+        wall = time.monotonic() - start
+        with lock:
+            state['running'] = False
+            self.groups.discard(shell.pid)
+            if not self.reaper:
+                shell.returncode = os.waitstatus_to_exitcode(status)
+        if timer:
+            timer.cancel()
+        code = -1 if state['expired'] else os.waitstatus_to_exitcode(status)
+        return Usage(code, usage.ru_utime, usage.ru_stime, wall,
+                     usage.ru_maxrss, state['expired'])
+
+    def kill_all(self):
+        for group in list(self.groups):
+            try:
+                os.killpg(group, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    @staticmethod
+    def confine(limits, affinity):
+        # Returns the shell commands that apply the limits and the affinity
+        # to the shell and so to the command it starts. They are not applied
+        # between fork and exec, which is unsafe while other threads run
+        commands = []
+        for key, limit in (limits or {}).items():
+            option, unit = LIMIT_OPTIONS[key]
+            commands.append('ulimit %s %d; ' % (option, limit // unit))
+        if affinity is not None:
+            commands.append('taskset -p -c %d $$ > /dev/null; ' % affinity)
+        return ''.join(commands)
+
+    @staticmethod
+    def can_pin(cpu):
+        # The shell goes on when taskset fails, so pinning is checked before
+        # runs rely on it
+        try:
+            return subprocess.run(
+                ['taskset', '-c', str(cpu), 'true'],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL).returncode == 0
+        except OSError:
+            return False
+
+    @staticmethod
+    def set_subreaper():
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            return libc.prctl(PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0) == 0
+        except (OSError, AttributeError):
+            return False
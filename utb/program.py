@@ -0,0 +1,160 @@
+# utb: UVa Online Judge toolbox
+# Copyright (C) 2024-2025  Daniel Donadon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import shlex
+
+
+class Program:
+
+    def __init__(self,
+                 toolbox,
+                 source_path,
+                 dir=None,
+                 language=None,
+                 problem=None):
+        self.toolbox = toolbox
+        self.source_path = source_path
+        self.dir = dir or os.path.dirname(source_path)
+        self.language = language or self.detect_language(toolbox, source_path)
+        assert self.language, 'unknown language: %s' % source_path
+        self.kwargs = toolbox.account.as_kwargs()
+        if problem:
+            self.kwargs.update(problem.as_kwargs())
+
+    @staticmethod
+    def detect_language(toolbox, filename):
+        # The current language is preferred when several languages share
+        # the same extension
+        extension = os.path.splitext(filename)[1]
+        languages = [
+            language for language in toolbox.get_languages()
+            if os.path.splitext(
+                toolbox.get_language('source', language=language))[1] ==
+            extension
+        ]
+        current = toolbox.get('language')
+        if current in languages:
+            return current
+        return languages[0] if languages else None
+
+    @staticmethod
+    def find(toolbox, dir, name, problem=None):
+        # Find the source of a helper program by its name without extension
+        for filename in sorted(os.listdir(dir)):
+            stem, _ = os.path.splitext(filename)
+            if stem == name and Program.detect_language(toolbox, filename):
+                build_dir = os.path.join(dir, '.helpers', name)
+                return Program(toolbox,
+                               os.path.join(dir, filename),
+                               dir=build_dir,
+                               problem=problem)
+        return None
+
+    @property
+    def name(self):
+        return os.path.splitext(os.path.basename(self.source_path))[0]
+
+    @property
+    def source(self):
+        return os.path.relpath(self.source_path, self.dir)
+
+    def get(self, key, default=None):
+        return self.toolbox.get_language(key, default, language=self.language)
+
+    @property
+    def exe(self):
+        exe = self.get('exe')
+        return exe.format(**self.kwargs) if exe else None
+
+    @property
+    def exe_path(self):
+        exe = self.exe
+        return os.path.join(self.dir, exe) if exe else None
+
+    def compile_command(self):
+        return self.toolbox.process.expand('compile',
+                                           language=self.language,
+                                           source=self.source,
+                                           exe=self.exe)
+
+    def compile(self, force=False, quiet=False, echo=True, shared=True):
+        # Builds that are not shared are neither restored from nor kept in
+        # the compile cache, leaving it to the solutions being worked on
+        os.makedirs(self.dir, exist_ok=True)
+        if self.exe is None:
+            if not quiet:
+                self.toolbox.console.print('There is no need to compile')
+            return True
+        if not os.path.isfile(self.source_path):
+            raise Exception(f'source not found: { self.source_path }')
+        kwargs = {'source': self.source, 'exe': self.exe}
+        command = self.compile_command()
+        cache = self.toolbox.cache
+        key = cache.key(self.dir, self.source, command)
+        if not force:
+            if cache.is_built(self.dir, self.exe, key):
+                if not quiet:
+                    self.toolbox.console.print('Executable is up to date')
+                return True
+            if shared and cache.restore(self.dir, self.exe, key):
+                if echo:
+                    self.toolbox.console.alternate('Restored', self.exe,
+                                                   'from compile cache')
+                return True
+        if os.path.isfile(self.exe_path):
+            os.remove(self.exe_path)
+        before = cache.snapshot(self.dir)
+        precompiled = self.toolbox.header.prepare(self.source_path,
+                                                  self.language,
+                                                  echo=echo)
+        if precompiled:
+            # Errors were already shown, so the fallback runs silently
+            command = self.toolbox.header.command(precompiled[0], self.language,
+                                                  **kwargs)
+            result = self.toolbox.process.execute(command,
+                                                  dir=self.dir,
+                                                  echo=echo)
+            if result == 0 and echo:
+                self.toolbox.header.report(*precompiled)
+            elif result != 0 and self.toolbox.process.run(
+                    'compile',
+                    echo=False,
+                    language=self.language,
+                    dir=self.dir,
+                    **kwargs) == 0:
+                result = 0
+                if echo:
+                    self.toolbox.console.print(
+                        'Compiled without the precompiled header')
+        else:
+            result = self.toolbox.process.run('compile',
+                                              language=self.language,
+                                              dir=self.dir,
+                                              echo=echo,
+                                              **kwargs)
+        if result == 0:
+            cache.store(self.dir, self.exe, key, before, shared=shared)
+        return result == 0
+
+    def command(self, *args, **kwargs):
+        # Arguments are appended after the redirections of the run command,
+        # where the shell still takes them as arguments of the program
+        kwargs.update(exe=self.exe, source=self.source)
+        command = self.toolbox.process.expand('run',
+                                              language=self.language,
+                                              **kwargs)
+        return ' '.join([command] + [shlex.quote(str(arg)) for arg in args])
@@ -0,0 +1,244 @@
+# utb: UVa Online Judge toolbox
+# Copyright (C) 2024-2025  Daniel Donadon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import hashlib
+import os
+import re
+import shutil
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .compare import Comparator
+from .pack import SolutionPack
+from .program import Program
+from .submission import Submission
+
+
+class Regress:
+    # Archived solutions are tested again with the tests archived along with
+    # them, either in the solution directory or packed. The outcome of each
+    # solution is kept with the hash of its build, tests and time limit, so
+    # an interrupted run resumes where it stopped and only changed solutions
+    # run again, such as after a compiler upgrade
+    TESTS = re.compile(r'^(\d+)\.tests\.zip$')
+    name = 'regress'
+
+    def __init__(self, toolbox):
+        self.toolbox = toolbox
+        self.workbench = toolbox.workbench
+        self.scratch = os.path.abspath(
+            os.path.join(toolbox.get('data-dir'), self.name))
+        self.filename = os.path.join(toolbox.get('data-dir'),
+                                     self.name + '.json')
+        # Set when the user interrupts a run, so workers stop before their
+        # next build or test
+        self.stopped = threading.Event()
+
+    def find(self, volumes):
+        # Yields the name, problem, tests and program of each archived
+        # solution, in every language found next to the tests
+        languages = self.toolbox.get_languages()
+        for dir, _, filenames in sorted(
+                os.walk(self.toolbox.get('solution-dir'))):
+            for filename in sorted(filenames):
+                match = self.TESTS.match(filename)
+                problem = match and self.toolbox.problemset.list.get(
+                    int(match.group(1)))
+                if not problem or volumes and problem.volume not in volumes:
+                    continue
+                kwargs = self.toolbox.account.as_kwargs()
+                kwargs.update(problem.as_kwargs())
+                for language in languages:
+                    source = self.toolbox.get_language(
+                        'source', language=language).format(**kwargs)
+                    path = os.path.abspath(os.path.join(dir, source))
+                    if not os.path.isfile(path):
+                        continue
+                    name = f'{ problem.number }-{ language }'
+                    program = Program(self.toolbox,
+                                      path,
+                                      dir=os.path.join(self.scratch, name),
+                                      language=language,
+                                      problem=problem)
+                    yield name, problem, os.path.join(dir, filename), program
+        yield from self.find_packed(volumes)
+
+    def find_packed(self, volumes):
+        # Packed solutions are extracted into the scratch directory
+        pack = SolutionPack(self.toolbox)
+        if not pack.enabled:
+            return
+        for number, language, *_ in list(pack.entries(volumes)):
+            problem = self.toolbox.problemset.list.get(number)
+            filename, source, tests = pack.read(number, language)
+            if not problem or not tests:
+                continue
+            name = f'{ number }-{ language }'
+            dir = os.path.join(self.scratch, name)
+            path = os.path.join(dir, 'source', filename)
+            self.toolbox.makedir(path)
+            with open(path, 'wb') as stream:
+                stream.write(source)
+            with open(dir + '.tests.zip', 'wb') as stream:
+                stream.write(tests)
+            program = Program(self.toolbox,
+                              path,
+                              dir=dir,
+                              language=language,
+                              problem=problem)
+            yield name, problem, dir + '.tests.zip', program
+
+    def key(self, problem, tests, program):
+        digest = hashlib.sha256()
+        digest.update(f'{ problem.time_limit }\0'.encode())
+        digest.update(program.get('run').encode())
+        with open(tests, 'rb') as stream:
+            digest.update(hashlib.sha256(stream.read()).digest())
+        if program.exe:
+            os.makedirs(program.dir, exist_ok=True)
+            digest.update(
+                self.toolbox.cache.key(program.dir, program.source,
+                                       program.compile_command()).encode())
+        else:
+            with open(program.source_path, 'rb') as stream:
+                digest.update(stream.read())
+        return digest.hexdigest()
+
+    def check(self, problem, tests, program):
+        # Returns the verdict of the solution, its longest CPU time and the
+        # test where either was found, or None if the run was interrupted
+        # Archived solutions are built in their own scratch directories, so
+        # they stay out of the compile cache of the problems being solved
+        if self.stopped.is_set():
+            return None
+        if not program.compile(quiet=True, echo=False, shared=False):
+            return 30, 0, None
+        dir = os.path.join(program.dir, 'tests')
+        shutil.rmtree(dir, ignore_errors=True)
+        with zipfile.ZipFile(tests) as archive:
+            archive.extractall(dir)
+        worst = 90, 0, None
+        comparator = Comparator(self.toolbox)
+        for filename in sorted(os.listdir(dir)):
+            test, extension = os.path.splitext(filename)
+            if extension != '.in':
+                continue
+            if self.stopped.is_set():
+                return None
+            files = {
+                extension: os.path.join(dir, f'{ test }.{ extension }')
+                for extension in ['in', 'out', 'ans', 'err']
+            }
+            command = program.command(input=files['in'],
+                                      output=files['out'],
+                                      error=files['err'])
+            usage = self.toolbox.process.profile(
+                command,
+                dir=program.dir,
+                timeout=problem.time_limit / 1000,
+                limits=self.workbench.get_limits(program.language))
+            time = usage.user + usage.system
+            verdict = self.workbench.get_verdict(usage, files['err'])
+            if verdict is None and os.path.isfile(files['ans']):
+                if comparator.compare(files['out'], files['ans']):
+                    verdict = 70
+            if verdict not in [None, 90]:
+                return verdict, time, test
+            if time > worst[1]:
+                worst = 90, time, test
+        shutil.rmtree(dir, ignore_errors=True)
+        return worst
+
+    def run(self, *volumes, jobs=None, fresh=False):
+        jobs = max(1, jobs or os.cpu_count() or 1)
+        state = {} if fresh else self.toolbox.read_json(self.filename,
+                                                        default={})
+        solutions, names, reused = [], [], 0
+        for name, problem, tests, program in self.find(volumes):
+            if name in names:
+                continue
+            names.append(name)
+            key = self.key(problem, tests, program)
+            if state.get(name, [None])[0] == key:
+                reused += 1
+            else:
+                state.pop(name, None)
+                solutions.append((name, problem, tests, program, key))
+        self.toolbox.console.alternate('Solutions',
+                                       len(solutions) + reused, ' Up to date',
+                                       reused, ' Parallel jobs', jobs)
+        done = 0
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {
+                executor.submit(self.check, *solution[1:4]): solution
+                for solution in solutions
+            }
+            try:
+                for future in as_completed(futures):
+                    name, _, _, _, key = futures[future]
+                    done += 1
+                    try:
+                        state[name] = [key, *future.result()]
+                    except Exception as error:
+                        # The solution is left out of the state, so it runs
+                        # again next time
+                        self.toolbox.console.print()
+                        self.toolbox.console.alternate('Error in', name + ':',
+                                                       str(error))
+                        continue
+                    self.toolbox.write_json(self.filename, state)
+                    self.toolbox.console.write('\rChecked %d of %d' %
+                                               (done, len(solutions)))
+            except KeyboardInterrupt:
+                self.stopped.set()
+                executor.shutdown(wait=False, cancel_futures=True)
+                self.toolbox.process.kill_all()
+                self.toolbox.console.print()
+                self.toolbox.console.print(f'Interrupted, type `{ self.name }`',
+                                           'again to resume')
+                return
+        if solutions:
+            self.toolbox.console.print()
+        self.report(state, names)
+
+    def report(self, state, names):
+        margin = self.toolbox.get('regress-margin')
+        failed, timeouts, close = 0, 0, 0
+        for name in names:
+            if name not in state:
+                continue
+            _, verdict, time, test = state[name]
+            number, language = name.split('-', 1)
+            problem = self.toolbox.problemset.list[int(number)]
+            limit = problem.time_limit / 1000
+            if verdict == 90 and time < (1 - margin) * limit:
+                continue
+            if verdict == 90:
+                close += 1
+                outcome = '%.0f%% of the time limit' % (100 * time / limit)
+            else:
+                timeouts += verdict == 50
+                failed += verdict != 50
+                outcome = Submission.VERDICT_CODES[verdict][1]
+            self.toolbox.console.print('%6s' % number,
+                                       '%-8s' % language,
+                                       '%6.3fs' % time,
+                                       outcome +
+                                       (f' on test { test }' if test else ''),
+                                       sep='  ')
+        self.toolbox.console.alternate('Failed', failed, ' Timeouts', timeouts,
+                                       ' Close to the time limit', close)
@@ -0,0 +1,166 @@
+# utb: UVa Online Judge toolbox
+# Copyright (C) 2024-2025  Daniel Donadon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import math
+import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .stress import Stress
+from .submission import Submission
+
+
+class Scale(Stress):
+    scratch_dir = '.scale'
+    # Models are given by the logarithm of their growth function
+    MODELS = [
+        ('n', lambda n: math.log(n)),
+        ('n log n', lambda n: math.log(n) + math.log(math.log2(n))),
+        ('n^2', lambda n: 2 * math.log(n)),
+        ('n^3', lambda n: 3 * math.log(n)),
+        ('2^n', lambda n: n * math.log(2)),
+    ]
+    MIN_TIME = 0.01  # seconds, faster runs are mostly noise
+    MIN_POINTS = 3
+
+    def prepare(self):
+        self.generator = self.find('stress-generator')
+        self.solution = self.workbench.program
+        self.workbench.check_source_file()
+        return (self.generator.compile(quiet=True) and
+                self.solution.compile(quiet=True))
+
+    def sizes(self, start, factor, maximum):
+        sizes, size = [], max(2, start)
+        while size < maximum:
+            sizes.append(size)
+            size = max(size + 1, round(size * factor))
+        return sizes + [maximum]
+
+    def measure(self, size):
+        # The generator is called with a fixed seed and the size
+        name = f'n{ size }'
+        self.generate(1, size, name=name)
+        usage = self.execute(self.solution,
+                             name,
+                             'out',
+                             timeout=self.workbench.problem.time_limit / 1000,
+                             limits=self.workbench.get_limits())
+        verdict = self.workbench.get_verdict(usage,
+                                             self.get_filename(name, 'err'))
+        self.clean(name)
+        return size, usage, verdict
+
+    def fit(self, points):
+        # Each model is fitted as t = c * f(n) by least squares in log space,
+        # where the constant is the mean of the residuals
+        best = None
+        for model, log in self.MODELS:
+            residuals = [math.log(time) - log(size) for size, time in points]
+            constant = sum(residuals) / len(residuals)
+            error = sum((r - constant)**2 for r in residuals)
+            if best is None or error < best[2]:
+                best = model, log, error, constant
+        return best
+
+    def exponent(self, points):
+        # Slope of the log-log regression, the empirical polynomial degree
+        xs = [math.log(size) for size, _ in points]
+        ys = [math.log(time) for _, time in points]
+        mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+        spread = sum((x - mean_x)**2 for x in xs)
+        return sum((x - mean_x) * (y - mean_y)
+                   for x, y in zip(xs, ys)) / spread if spread else 0
+
+    def run(self, maximum, start=None, factor=None, jobs=None):
+        # The n log n model is undefined below size 2
+        start = start or self.toolbox.get('scale-start')
+        assert maximum >= 2, 'maximum size must be at least 2'
+        assert start >= 2, 'starting size must be at least 2'
+        if not self.prepare():
+            return
+        factor = max(1.1, factor or self.toolbox.get('scale-factor'))
+        jobs = max(1, jobs or self.toolbox.get('test-jobs') or 1)
+        limit = self.workbench.problem.time_limit / 1000
+        sizes = iter(self.sizes(start, factor, maximum))
+        self.toolbox.console.alternate('Time limit', '%.3fs' % limit,
+                                       ' Maximum size', maximum,
+                                       ' Parallel jobs', jobs)
+        self.toolbox.console.print('%10s' % 'Size',
+                                   '%7s' % 'Time',
+                                   '%9s' % 'Memory',
+                                   'Verdict',
+                                   bold=True,
+                                   sep='  ')
+        results, failed = {}, None
+        os.makedirs(self.scratch, exist_ok=True)
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                # Sizes are submitted in increasing order, and no larger size
+                # is started once one of them fails
+                pending = set()
+                while failed is None:
+                    for size in sizes:
+                        pending.add(executor.submit(self.measure, size))
+                        if len(pending) >= jobs:
+                            break
+                    if not pending:
+                        break
+                    finished, pending = wait(pending,
+                                             return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        size, usage, verdict = future.result()
+                        results[size] = usage, verdict
+                        if verdict is not None and (failed is None or
+                                                    size < failed):
+                            failed = size
+                for future in pending:
+                    future.cancel()
+        finally:
+            shutil.rmtree(self.scratch, ignore_errors=True)
+        points = []
+        for size in sorted(results):
+            if failed is not None and size > failed:
+                break
+            usage, verdict = results[size]
+            time = usage.user + usage.system
+            self.toolbox.console.print('%10d' % size,
+                                       '%6.3fs' % time,
+                                       '%6.1f MB' % (usage.memory / 1024),
+                                       'Okay' if verdict is None else
+                                       Submission.VERDICT_CODES[verdict][1],
+                                       sep='  ')
+            if verdict is None and time >= self.MIN_TIME:
+                points.append((size, time))
+        self.report(points, maximum, limit)
+
+    def report(self, points, maximum, limit):
+        if len(points) < self.MIN_POINTS:
+            self.toolbox.console.print('Not enough measurements above',
+                                       '%.3fs' % self.MIN_TIME,
+                                       'to fit a model')
+            return
+        model, log, _, constant = self.fit(points)
+        self.toolbox.console.alternate('Best fit', f'O({ model })',
+                                       ' Empirical exponent',
+                                       '%.2f' % self.exponent(points))
+        try:
+            predicted = math.exp(constant + log(maximum))
+        except OverflowError:
+            predicted = math.inf
+        self.toolbox.console.alternate(
+            'Predicted time for size', maximum, 'is', '%.3fs' % predicted,
+            '(%.0f%% of the time limit)' % (100 * predicted / limit))
@@ -34,10 +34,70 @@ DEFAULT_SETTINGS = {
         'c',  # {'c', 'c99', 'cpp', 'python', 'java', 'pascal'}
     'use-volume-in-solution-dir':
         True,
+    'solution-pack':
+        None,  # file in solution-dir to pack archived solutions into
+    'regress-margin':
+        0.2,  # fraction of the time limit below which `regress` warns
     'bypass-ssl-certificate':
         False,
     'no-spoiler':
         False,
+    'test-jobs':
+        1,
+    'test-store':
+        True,  # keep the tests of every problem compressed in data-dir
+    'source-snapshots':
+        True,  # keep every compiled source (see `bisect`)
+    'history-size':
+        20,  # runs of each test kept (see `trend`)
+    'history-threshold':
+        1.5,  # warn when a test is this many times slower than its best
+    'watch-interval':
+        0.5,  # seconds between polls of `watch`
+    'result-cache':
+        True,  # reuse results of unchanged tests (see `test --fresh`)
+    'test-pipes':
+        False,  # keep outputs in memory, saving only those of failing tests
+    'test-scratch-dir':
+        '/dev/shm',
+    'memory-limit':
+        512,  # MB of peak resident memory for each test run
+    'address-space-limit':
+        1024,  # MB, enforced on each test run, 0 for no limit
+    'stack-limit':
+        256,  # MB
+    'output-limit':
+        64,  # MB
+    'compile-cache':
+        200,  # maximum number of builds kept, 0 to disable
+    'precompiled-headers':
+        True,
+    'stress-generator':
+        'gen',
+    'stress-brute':
+        'brute',
+    'stress-iterations':
+        1000,
+    'stress-timeout':
+        10,  # seconds for the generator and the brute-force solution
+    'stress-shrink-attempts':
+        200,
+    'scale-start':
+        16,
+    'scale-factor':
+        2.0,
+    'bench-runs':
+        10,
+    'bench-warmup':
+        2,
+    'bench-cpu':
+        None,  # number of the CPU to pin benchmark runs to
+    'compare':
+        'exact',  # {'exact', 'whitespace', 'token', 'float', 'diff'}
+    'compare-tolerance':
+        1e-6,
+    'checker':
+        'checker',  # special judge in the problem directory, in any language
 
     # Hacks
     'force-cpp-on-ansi-c':
@@ -66,8 +126,6 @@ DEFAULT_SETTINGS = {
         'gnome-text-editor {}',
     'diff':
         'diff -q {output} {answer} > /dev/null',
-    'time':
-        '/usr/bin/time -f "%E" -o {time} {run}',
     'c-source':
         '{problem_number}.c',
     'c-exe':
@@ -123,10 +181,14 @@ DEFAULT_SETTINGS = {
         '{problem_number}.java',
     'java-exe':
         'Main.class',
+    'java-address-space-limit':
+        0,  # the JVM reserves more address space than it uses
     'java-compile':
         'javac {source} -d {dir} -source 8 -target 8 -Xlint:-options',
     'java-run':
         'java {exe} < {input} > {output} 2> {error}',
+    'java-harness':
+        False,  # run test cases on a single JVM, loading Main for each one
     'java-template':
         """
         /* {problem_number}
@@ -149,6 +211,10 @@ DEFAULT_SETTINGS = {
         '{problem_number}.py',
     'python-run':
         'python {source} < {input} > {output} 2> {error}',
+    'python-fork-server':
+        False,  # run test cases on forks of a pre-started interpreter
+    'python-preload':
+        'bisect collections functools heapq itertools math re string',
     'python-template':
         """
         # {problem_number}
@@ -0,0 +1,200 @@
+# utb: UVa Online Judge toolbox
+# Copyright (C) 2024-2025  Daniel Donadon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .stress import Stress
+from .submission import Submission
+
+
+class Split(Stress):
+    # The input of a test is split into its cases by a rule, which is kept
+    # in the problem directory once given:
+    #   count   a leading line with the number of cases
+    #   blank   cases separated by blank lines
+    #   end     cases followed by a terminator line, such as "0 0"
+    # Except for blank lines, each case takes a fixed number of lines
+    scratch_dir = '.split'
+    rule_filename = '.split-rule'
+    RULES = ['count', 'blank', 'end']
+    SLOWEST = 5
+
+    def get_rule(self, rule, size):
+        filename = os.path.join(self.dir, self.rule_filename)
+        if rule:
+            assert rule[0] in self.RULES, 'invalid rule: %s' % rule[0]
+            assert rule[0] != 'end' or len(rule) > 1, (
+                'terminator line must follow the rule')
+            saved = [rule[0], ' '.join(rule[1:]), 1]
+        else:
+            saved = self.toolbox.read_json(
+                filename, or_error='splitting rule must be typed as argument')
+        saved[2] = size or saved[2]
+        self.toolbox.write_json(filename, saved)
+        self.kind, self.terminator, self.size = saved
+
+    def parse(self, lines):
+        # Returns the line where each case starts and the lines of the cases
+        start, end = 0, len(lines)
+        if self.kind == 'count':
+            start = 1
+        elif self.kind == 'end':
+            end = next((index for index, line in enumerate(lines)
+                        if line.split() == self.terminator.split()), end)
+        cases = []
+        if self.kind == 'blank':
+            for index in range(start, end):
+                if not lines[index].strip():
+                    continue
+                if index == start or not lines[index - 1].strip():
+                    cases.append((index + 1, []))
+                cases[-1][1].append(lines[index])
+        else:
+            for index in range(start, end, self.size):
+                cases.append((index + 1, lines[index:index + self.size]))
+        return cases
+
+    def assemble(self, name, cases):
+        with open(self.get_filename(name, 'in'), 'w') as stream:
+            if self.kind == 'count':
+                stream.write('%d\n' % len(cases))
+            for index, (_, lines) in enumerate(cases):
+                if self.kind == 'blank' and index > 0:
+                    stream.write('\n')
+                stream.writelines(lines)
+            if self.kind == 'end':
+                stream.write(self.terminator + '\n')
+        return name
+
+    def measure(self, name, cases):
+        usage = self.execute(self.solution,
+                             self.assemble(name, cases),
+                             'out',
+                             timeout=self.workbench.problem.time_limit / 1000,
+                             limits=self.workbench.get_limits())
+        verdict = self.workbench.get_verdict(usage,
+                                             self.get_filename(name, 'err'))
+        tokens = self.read(name, 'out').split()
+        self.clean(name)
+        return usage, verdict, tokens
+
+    def prefix(self, count):
+        # Each prefix runs once, under a name of its own for each thread,
+        # since a prefix may be needed by two probes at the same time
+        if count not in self.prefixes:
+            self.prefixes[count] = self.measure(
+                f'p{ count }-{ threading.get_ident() }', self.cases[:count])
+        return self.prefixes[count]
+
+    def diverges(self, count):
+        # The output of the first cases must be the start of the answer,
+        # so a prefix of cases is run and its tokens are compared. Its
+        # output must also grow from the prefix before it, or the last case
+        # printed nothing
+        _, verdict, tokens = self.prefix(count)
+        if verdict is not None:
+            return True
+        if count == len(self.cases):
+            return tokens != self.answer
+        previous = self.prefix(count - 1)[2] if count > 1 else []
+        return (tokens != self.answer[:len(tokens)] or
+                len(tokens) <= len(previous))
+
+    def search(self, executor, jobs):
+        # The first case that diverges is found by probing prefixes at
+        # evenly spaced points, one for each job
+        good, bad = 0, len(self.cases)
+        while bad - good > 1:
+            count = min(jobs, bad - good - 1)
+            points = sorted({
+                good + (k + 1) * (bad - good) // (count + 1)
+                for k in range(count)
+            })
+            for point, failed in zip(points,
+                                     executor.map(self.diverges, points)):
+                if failed:
+                    bad = point
+                    break
+                good = point
+        return bad - 1
+
+    def run(self, test, rule=None, size=None, jobs=None):
+        self.get_rule(rule, size)
+        input = self.workbench.get_filename(f'{ test }.in')
+        assert os.path.isfile(input), f'test case not found: { test }'
+        with open(input) as stream:
+            self.cases = self.parse(stream.readlines())
+        assert self.cases, 'no cases found with the splitting rule'
+        self.solution = self.workbench.program
+        self.workbench.check_source_file()
+        if not self.workbench.compile(quiet=True):
+            return
+        jobs = max(1, jobs or self.toolbox.get('test-jobs') or 1)
+        self.toolbox.console.alternate('Test', test, 'has', len(self.cases),
+                                       'cases split by', self.kind,
+                                       ' Parallel jobs', jobs)
+        os.makedirs(self.scratch, exist_ok=True)
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                results = list(
+                    executor.map(
+                        lambda index: self.measure(f'c{ index }',
+                                                   [self.cases[index]]),
+                        range(len(self.cases))))
+                self.report(results)
+                answer = self.workbench.get_filename(f'{ test }.ans')
+                if os.path.isfile(answer):
+                    with open(answer, 'rb') as stream:
+                        self.answer = stream.read().split()
+                    self.prefixes = {}
+                    if self.diverges(len(self.cases)):
+                        index = self.search(executor, jobs)
+                        self.toolbox.console.alternate(
+                            'First case that diverges from the answer',
+                            f'#{ index + 1 }', 'at line', self.cases[index][0])
+                    else:
+                        self.toolbox.console.print(
+                            'No case diverges from the answer')
+        finally:
+            shutil.rmtree(self.scratch, ignore_errors=True)
+
+    def report(self, results):
+        # Cases that fail alone are listed along with the slowest ones
+        times = [usage.user + usage.system for usage, _, _ in results]
+        order = sorted(range(len(results)), key=lambda index: -times[index])
+        listed = order[:self.SLOWEST] + [
+            index for index in order[self.SLOWEST:]
+            if results[index][1] is not None
+        ]
+        self.toolbox.console.print('%6s' % 'Case',
+                                   '%6s' % 'Line',
+                                   '%7s' % 'Time',
+                                   '%9s' % 'Memory',
+                                   'Verdict',
+                                   bold=True,
+                                   sep='  ')
+        for index in listed:
+            usage, verdict, _ = results[index]
+            self.toolbox.console.print('%6s' % f'#{ index + 1 }',
+                                       '%6d' % self.cases[index][0],
+                                       '%6.3fs' % times[index],
+                                       '%6.1f MB' % (usage.memory / 1024),
+                                       'Okay' if verdict is None else
+                                       Submission.VERDICT_CODES[verdict][1],
+                                       sep='  ')
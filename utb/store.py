@@ -0,0 +1,206 @@
+# utb: UVa Online Judge toolbox
+# Copyright (C) 2024-2025  Daniel Donadon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import gzip
+import hashlib
+import os
+import shutil
+import time
+import zipfile
+
+
+class ContentStore:
+    # Files are stored compressed by the hash of their content, so a file
+    # shared by several problems or sessions is stored once. The index maps
+    # each problem to the hashes of its files
+    CHUNK_SIZE = 1 << 20
+    # Inputs may take hundreds of MB, so storing them favours speed over
+    # size, which the low levels of gzip mostly keep
+    COMPRESS_LEVEL = 1
+    index_filename = 'index.json'
+
+    def __init__(self, toolbox, name):
+        self.toolbox = toolbox
+        self.base_dir = os.path.join(toolbox.get('data-dir'), name)
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            filename = os.path.join(self.base_dir, self.index_filename)
+            self._index = self.toolbox.read_json(filename, default={})
+        return self._index
+
+    def save(self):
+        filename = os.path.join(self.base_dir, self.index_filename)
+        self.toolbox.write_json(filename, self.index)
+
+    def object_path(self, digest):
+        return os.path.join(self.base_dir, digest[:2], digest + '.gz')
+
+    def hash(self, stream):
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: stream.read(self.CHUNK_SIZE), b''):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def put(self, stream):
+        # Stores the content of a binary stream that can be rewound and
+        # returns its hash
+        digest = self.hash(stream)
+        path = self.object_path(digest)
+        if not os.path.isfile(path):
+            stream.seek(0)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = path + '.tmp'
+            with gzip.open(temporary, 'wb',
+                           compresslevel=self.COMPRESS_LEVEL) as compressed:
+                shutil.copyfileobj(stream, compressed, self.CHUNK_SIZE)
+            os.replace(temporary, path)
+        return digest
+
+    def get(self, digest, filename):
+        with gzip.open(self.object_path(digest), 'rb') as compressed:
+            with open(filename, 'wb') as stream:
+                shutil.copyfileobj(compressed, stream, self.CHUNK_SIZE)
+
+
+class TestStore(ContentStore):
+    # Solutions read their tests from the problem directory, which stays the
+    # reference, so the store keeps a copy of them that outlives the
+    # directory and restores it when the problem is added again
+    EXTENSIONS = ('.in', '.ans', '.gen')
+    # Answers often come as ".out" files in archives of tests
+    ALIASES = {'.out': '.ans'}
+
+    def __init__(self, toolbox):
+        super().__init__(toolbox, 'tests')
+        self.enabled = toolbox.get('test-store')
+
+    def digest(self, problem, dir, filename):
+        # The hash of a test file is taken from the index when it is there
+        entries = self.index.get(str(problem.number),
+                                 {}) if self.enabled else {}
+        if filename in entries:
+            return entries[filename][0]
+        path = os.path.join(dir, filename)
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as stream:
+            return self.hash(stream)
+
+    def sync(self, problem, dir):
+        # The test files of the problem directory are the reference, so
+        # the index follows additions, changes and removals. Files are only
+        # hashed again when their size or modification time changed
+        if not self.enabled:
+            return
+        key = str(problem.number)
+        entries = self.index.get(key, {})
+        updated = {}
+        for filename in os.listdir(dir):
+            if not filename.endswith(self.EXTENSIONS):
+                continue
+            stat = os.stat(os.path.join(dir, filename))
+            entry = entries.get(filename)
+            if entry and entry[1:] == [stat.st_size, stat.st_mtime_ns]:
+                updated[filename] = entry
+                continue
+            with open(os.path.join(dir, filename), 'rb') as stream:
+                digest = self.put(stream)
+            updated[filename] = [digest, stat.st_size, stat.st_mtime_ns]
+        if updated != entries:
+            if updated:
+                self.index[key] = updated
+            else:
+                self.index.pop(key, None)
+            self.save()
+
+    def restore(self, problem, dir):
+        # Writes the stored tests of a problem that are missing in its
+        # directory and returns how many were restored
+        if not self.enabled:
+            return 0
+        key = str(problem.number)
+        entries = self.index.get(key, {})
+        restored = 0
+        for filename, entry in entries.items():
+            path = os.path.join(dir, filename)
+            if os.path.isfile(path) or not os.path.isfile(
+                    self.object_path(entry[0])):
+                continue
+            self.get(entry[0], path)
+            stat = os.stat(path)
+            entry[1:] = [stat.st_size, stat.st_mtime_ns]
+            restored += 1
+        if restored:
+            self.save()
+        return restored
+
+    def members(self, path):
+        # Yields the name and an open stream of each file in a directory
+        # tree or in a zip archive
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir():
+                        with archive.open(info) as stream:
+                            yield info.filename, stream
+        elif os.path.isdir(path):
+            for root, _, filenames in os.walk(path):
+                for filename in sorted(filenames):
+                    with open(os.path.join(root, filename), 'rb') as stream:
+                        yield filename, stream
+        else:
+            raise Exception(f'not a directory or zip archive: { path }')
+
+    def import_tests(self, problem, dir, path):
+        # Test files are copied into the problem directory by their base
+        # name, and then stored along with the others
+        imported = []
+        for name, stream in self.members(path):
+            name, extension = os.path.splitext(os.path.basename(name))
+            extension = self.ALIASES.get(extension, extension)
+            if not name or extension not in self.EXTENSIONS:
+                continue
+            filename = os.path.join(dir, name + extension)
+            with open(filename, 'wb') as target:
+                shutil.copyfileobj(stream, target, self.CHUNK_SIZE)
+            imported.append(name + extension)
+        self.sync(problem, dir)
+        return imported
+
+
+class SnapshotStore(ContentStore):
+    # Each problem keeps the successive versions of its source, in the order
+    # they were compiled, as their date, hash, filename and language
+
+    def __init__(self, toolbox):
+        super().__init__(toolbox, 'snapshots')
+        self.enabled = toolbox.get('source-snapshots')
+
+    def take(self, problem, path, language):
+        if not self.enabled:
+            return
+        with open(path, 'rb') as stream:
+            entry = [self.put(stream), os.path.basename(path), language]
+        snapshots = self.index.setdefault(str(problem.number), [])
+        if not snapshots or snapshots[-1][1:] != entry:
+            snapshots.append([int(time.time())] + entry)
+            self.save()
+
+    def list(self, problem):
+        return self.index.get(str(problem.number), [])
@@ -0,0 +1,196 @@
+# utb: UVa Online Judge toolbox
+# Copyright (C) 2024-2025  Daniel Donadon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .compare import Comparator
+from .program import Program
+from .submission import Submission
+
+
+class Stress:
+    scratch_dir = '.stress'
+
+    def __init__(self, workbench):
+        self.toolbox = workbench.toolbox
+        self.workbench = workbench
+        self.dir = workbench.dir()
+        self.scratch = os.path.abspath(os.path.join(self.dir, self.scratch_dir))
+        self.timeout = self.toolbox.get('stress-timeout')
+
+    def find(self, setting):
+        name = self.toolbox.get(setting)
+        program = Program.find(self.toolbox, self.dir, name,
+                               self.workbench.problem)
+        assert program, f'source not found: { name }'
+        return program
+
+    def prepare(self):
+        self.generator = self.find('stress-generator')
+        self.brute = self.find('stress-brute')
+        self.solution = self.workbench.program
+        self.workbench.check_source_file()
+        return (self.generator.compile(quiet=True) and
+                self.brute.compile(quiet=True) and
+                self.solution.compile(quiet=True))
+
+    def get_filename(self, name, extension):
+        return os.path.join(self.scratch, f'{ name }.{ extension }')
+
+    def read(self, name, extension):
+        with open(self.get_filename(name, extension), 'rb') as stream:
+            return stream.read()
+
+    def execute(self,
+                program,
+                name,
+                extension,
+                *args,
+                timeout=None,
+                limits=None):
+        command = program.command(*args,
+                                  input=self.get_filename(name, 'in'),
+                                  output=self.get_filename(name, extension),
+                                  error=self.get_filename(name, 'err'))
+        return self.toolbox.process.profile(command,
+                                            dir=program.dir,
+                                            timeout=timeout or self.timeout,
+                                            limits=limits)
+
+    def generate(self, seed, *args, name=None):
+        # The generator writes the input of a case given its seed
+        name = name or str(seed)
+        with open(self.get_filename(name, 'in'), 'w'):
+            pass
+        usage = self.execute(self.generator, name, 'gen', seed, *args)
+        assert usage.code == 0, f'generator failed with seed { seed }'
+        os.replace(self.get_filename(name, 'gen'),
+                   self.get_filename(name, 'in'))
+        return name
+
+    def check(self, name):
+        # Returns the verdict of the solution for a generated input, or None
+        # when the brute-force solution failed and the input is not valid
+        usage = self.execute(self.brute, name, 'ans')
+        if usage.code != 0:
+            return None
+        usage = self.execute(self.solution,
+                             name,
+                             'out',
+                             timeout=self.workbench.problem.time_limit / 1000,
+                             limits=self.workbench.get_limits())
+        verdict = self.workbench.get_verdict(usage,
+                                             self.get_filename(name, 'err'))
+        if verdict is None:
+            comparator = Comparator(self.toolbox)
+            verdict = 70 if comparator.compare(self.read(name, 'out'),
+                                               self.read(name, 'ans')) else 90
+        return verdict
+
+    def iterate(self, seed):
+        name = self.generate(seed)
+        verdict = self.check(name)
+        assert verdict is not None, (
+            f'brute-force solution failed with seed { seed }')
+        if verdict == 90:
+            self.clean(name)
+        return seed, verdict
+
+    def clean(self, name):
+        for extension in ['in', 'gen', 'out', 'ans', 'err']:
+            filename = self.get_filename(name, extension)
+            if os.path.isfile(filename):
+                os.remove(filename)
+
+    def run(self, iterations, jobs=None, seed=1):
+        if not self.prepare():
+            return
+        jobs = max(1, jobs or self.toolbox.get('test-jobs') or 1)
+        os.makedirs(self.scratch, exist_ok=True)
+        self.toolbox.console.alternate('Running', iterations, 'iterations on',
+                                       jobs, 'parallel jobs')
+        failure, done = None, 0
+        seeds = iter(range(seed, seed + iterations))
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                # Only a few iterations are queued at once, so the run stops
+                # soon after the first failure
+                pending = set()
+                while failure is None:
+                    for seed in seeds:
+                        pending.add(executor.submit(self.iterate, seed))
+                        if len(pending) >= 2 * jobs:
+                            break
+                    if not pending:
+                        break
+                    finished, pending = wait(pending,
+                                             return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        seed, verdict = future.result()
+                        done += 1
+                        if verdict != 90 and (failure is None or
+                                              seed < failure[0]):
+                            failure = seed, verdict
+                    self.toolbox.console.write('\rIterations %d' % done)
+                for future in pending:
+                    future.cancel()
+            self.toolbox.console.print()
+            if failure is None:
+                self.toolbox.console.print('No failure found', bold=True)
+                return True
+            seed, verdict = failure
+            self.toolbox.console.alternate('Seed', seed, 'failed with',
+                                           Submission.VERDICT_CODES[verdict][1])
+            self.save(self.shrink(str(seed)))
+            return False
+        finally:
+            shutil.rmtree(self.scratch, ignore_errors=True)
+
+    def shrink(self, name):
+        # Remove chunks of lines from the failing input while it still fails
+        # and the brute-force solution still accepts it
+        with open(self.get_filename(name, 'in')) as stream:
+            lines = stream.readlines()
+        attempts = self.toolbox.get('stress-shrink-attempts')
+        candidate = name + '.shrink'
+        chunk = len(lines) // 2
+        while chunk > 0 and attempts > 0:
+            index = 0
+            while index < len(lines) and attempts > 0:
+                attempts -= 1
+                reduced = lines[:index] + lines[index + chunk:]
+                with open(self.get_filename(candidate, 'in'), 'w') as stream:
+                    stream.writelines(reduced)
+                if reduced and self.check(candidate) not in [None, 90]:
+                    lines = reduced
+                else:
+                    index += chunk
+            chunk //= 2
+        with open(self.get_filename(name, 'in'), 'w') as stream:
+            stream.writelines(lines)
+        self.check(name)
+        self.toolbox.console.alternate('Input shrunk to', len(lines), 'lines')
+        return name
+
+    def save(self, name):
+        test = self.workbench.next_test_name()
+        shutil.copy(self.get_filename(name, 'in'),
+                    self.workbench.get_filename(f'{ test }.in'))
+        shutil.copy(self.get_filename(name, 'ans'),
+                    self.workbench.get_filename(f'{ test }.ans'))
+        self.toolbox.console.alternate('Failing input saved as test', test)
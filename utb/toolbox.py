@@ -24,19 +24,37 @@ from collections import OrderedDict
 import yaml
 
 from .account import Account
+from .bench import Bench
+from .bisection import Bisect
 from .book import Book
+from .cache import CompileCache
+from .calibration import Calibration
 from .console import Console
+from .header import PrecompiledHeader
+from .matrix import Matrix
+from .pack import SolutionPack
 from .problem import ProblemSet
 from .process import Process
+from .regress import Regress
+from .scale import Scale
 from .settings import DEFAULT_SETTINGS
+from .split import Split
+from .stress import Stress
 from .submission import UserHistory
 from .uhunt import UHunt
-from .utils import trim
+from .utils import parse_options, trim
 from .uva import UVa
+from .watch import Watch
 from .workbench import Workbench
 
 
 class Toolbox:
+    # Commands added after the others, which give way to them when typed
+    # by a prefix that matches both
+    SECONDARY_COMMANDS = {
+        'bench', 'bisect', 'calibrate', 'import', 'matrix', 'pack', 'regress',
+        'scale', 'split', 'stress', 'trend', 'watch'
+    }
 
     def __init__(self, config):
         if not os.path.isfile(config):
@@ -58,8 +76,11 @@ class Toolbox:
         self.uhunt = UHunt(self)
         self.uva = UVa(self)
         self.process = Process(self)
+        self.cache = CompileCache(self)
+        self.header = PrecompiledHeader(self)
         self.history = UserHistory(self)
         self.workbench = Workbench(self)
+        self.watch = Watch(self)
         self.load_commands()
 
         if self.get('bypass-ssl-certificate'):
@@ -73,11 +94,16 @@ class Toolbox:
         return (self.config.get(key)
                 if key in self.config else DEFAULT_SETTINGS.get(key, default))
 
-    def get_language(self, key, default=None):
-        key = '%s-%s' % (self.get('language'), key)
+    def get_language(self, key, default=None, language=None):
+        key = '%s-%s' % (language or self.get('language'), key)
         return (self.config.get(key)
                 if key in self.config else DEFAULT_SETTINGS.get(key, default))
 
+    def get_languages(self):
+        suffix = '-source'
+        keys = set(DEFAULT_SETTINGS.keys()) | set(self.config.keys())
+        return sorted(k[:-len(suffix)] for k in keys if k.endswith(suffix))
+
     def makedir(self, filename):
         path, _ = os.path.split(filename)
         if not os.path.exists(path):
@@ -114,12 +140,18 @@ class Toolbox:
         commands = [k for k in self.commands if k.startswith(prefix)]
         if not commands:
             raise Exception('command not found: %s' % prefix)
+        primary = [k for k in commands if k not in self.SECONDARY_COMMANDS]
+        if len(commands) > 1 and len(primary) == 1:
+            return primary[0]
         if len(commands) > 1:
             raise Exception('ambiguous command: %s' % ', '.join(commands))
         return commands[0]
 
     def run(self):
-        self.console.run()
+        try:
+            self.console.run()
+        finally:
+            self.workbench.close()
 
     def command_exit(self, *args):
         """
@@ -269,6 +301,7 @@ class Toolbox:
         data = self.uhunt.get_problemset()
         self.problemset = ProblemSet(self, data)
         self.problemset.save()
+        self.workbench.close()
         self.workbench = Workbench(self)
         if self.account:
             self.console.print('Retrieving submission data...')
@@ -290,6 +323,7 @@ class Toolbox:
         Start solving a new problem. The problem is added to the list of
         problems being solved and is selected as the current problem.
         A source code file for the problem will be created and opened.
+        Tests of a problem solved before are restored (see `import`).
         To add a specific problem, type its number. To add the previous
         problem, type `-`.
         """
@@ -314,6 +348,18 @@ class Toolbox:
             test = args[0] if args[0] != '+' else None
             self.workbench.edit_test(test)
 
+    def command_import(self, *args):
+        """
+        Import test cases into the current problem from a directory or
+        a zip archive, which must be typed as argument. Files with ".in",
+        ".ans" and ".gen" extensions are imported, as well as ".out"
+        files, which are taken as answers. Tests of every problem are
+        kept compressed in the data directory, so they are restored when
+        the problem is added again (see `add`).
+        """
+        assert len(args) == 1, 'path must be typed as argument'
+        self.workbench.import_tests(args[0])
+
     def command_select(self, *args):
         """
         Change the current problem being solved. The problem must have
@@ -329,10 +375,11 @@ class Toolbox:
 
     def command_remove(self, *args):
         """
-        Remove a problem that is being solved. All data related to the
-        problem will be permanently removed, except for its archived
-        solution (see `archive`). The problem's number must be typed as
-        argument.
+        Remove a problem that is being solved. Its directory will be
+        permanently removed, except for its archived solution (see
+        `archive`). Its tests stay compressed in the data directory and
+        are restored when the problem is added again (see `add`). The
+        problem's number must be typed as argument.
         """
         problem = self.problemset.get_problem(*args, ignore_current=True)
         assert problem in self.workbench.works, 'problem is not being solved'
@@ -342,21 +389,192 @@ class Toolbox:
         """
         Compile the current problem's source code. The command line to
         compile is defined in the settings. The default command is the
-        same used by UVa Online Judge.
+        same used by UVa Online Judge. Builds are cached by the content
+        of the source, its local headers and the command line, so an
+        identical build is restored instantly. To compile anyway, type
+        `-f` as argument.
         """
-        self.workbench.compile()
+        _, options = parse_options(args, f=False)
+        self.workbench.compile(force=options['f'])
 
     def command_test(self, *args):
         """
         Run the solution against a set of tests. All files with ".in"
         extension are considered input test cases. A test case may have
-        an answer file indicated by ".ans" extension. To run all test
+        an answer file indicated by ".ans" extension. A test case may also
+        be generated by a file with ".gen" extension, whose first line is
+        a command that writes the input and whose optional second line is
+        the command of a reference solution that writes the answer from
+        that input. Generated inputs are never stored. To run all test
         cases, type this command without arguments. To run a subset of
         tests, type their names separated by space. To add or edit
         a test case, use the command `edit`. If the source code was
         modified, it will be compiled before the tests (see `compile`).
+        To run the tests in parallel, type `-j` followed by the number of
+        jobs. The default number of jobs is defined in the settings.
+        Results of tests whose input, answer and executable did not
+        change are reused and marked as cached, except time limits,
+        which depend on the load of the machine. To run all tests
+        anyway, type `--fresh`. Tests that failed in the last run go first, and
+        parallel runs start with the longest tests. To stop at the first
+        failure, type `--fail-fast`.
+        """
+        tests, options = parse_options(args, j=0, fresh=False, fail_fast=False)
+        self.workbench.test(*tests,
+                            jobs=options['j'],
+                            fresh=options['fresh'],
+                            fail_fast=options['fail_fast'])
+
+    def command_watch(self, *args):
+        """
+        Watch the source and the test files of the current problem in
+        the background while the shell stays available. When the source
+        is saved, it is compiled and all tests run again; when a test
+        file is saved, only that test runs again. A status line with the
+        failing tests is printed after each change. To stop watching,
+        type the command again.
+        """
+        if self.watch.running:
+            self.watch.stop()
+            self.console.print('Stopped watching')
+            return
+        assert self.current_problem, 'there is no problem selected'
+        self.workbench.check_source_file()
+        self.watch.start()
+        self.console.print('Watching', self.workbench.source, 'and test files')
+
+    def command_trend(self, *args):
         """
-        self.workbench.test(*args)
+        Show the history of test runs of the current problem. Each run
+        of a test is listed with its date, the hash of the source, its
+        language, CPU time and peak memory, and whether it passed. A
+        warning is shown by `test` when a test becomes slower or uses
+        more memory than its best previous run in the same language by
+        the threshold in the settings. To
+        show a subset of tests, type their names separated by space.
+        """
+        assert self.current_problem, 'there is no problem selected'
+        self.workbench.history.trend(self.current_problem, *args)
+
+    def command_bisect(self, *args):
+        """
+        Find which version of the source broke a test case. A snapshot of
+        the source is kept whenever it is compiled or tested, and the
+        snapshots are searched for the first one that fails the test or
+        is slower than the oldest snapshot by the threshold of `trend`.
+        The oldest snapshot must pass the test; if the test has no
+        answer, its output is taken as the answer. Type the name of the
+        test as argument. To set the threshold, type `-t` followed by
+        the factor. To set the number of snapshots probed in parallel,
+        type `-j` followed by the number.
+        """
+        assert self.current_problem, 'there is no problem selected'
+        args, options = parse_options(args, t=0.0, j=0)
+        assert len(args) == 1, 'name of the test must be typed as argument'
+        Bisect(self.workbench).run(args[0],
+                                   threshold=options['t'],
+                                   jobs=options['j'])
+
+    def command_bench(self, *args):
+        """
+        Measure the solution precisely by running each test case several
+        times after a few warm-up runs, which are not measured. Runs are
+        sequential and the input is loaded into memory beforehand. Prints
+        the minimum, median and 95th percentile of CPU time, the peak
+        memory, the headroom of the slowest runs against the time limit
+        and the gap of the median to the best time. Type the names of
+        the tests to run a subset. To set the number of runs or warm-up
+        runs, type `-n` or `-w` followed by the number. To pin the runs
+        to a CPU, type `-c` followed by its number. Defaults are defined
+        in the settings.
+        """
+        assert self.current_problem, 'there is no problem selected'
+        tests, options = parse_options(args, n=0, w=-1, c=-1)
+        warmup, cpu = options['w'], options['c']
+        Bench(self.workbench).run(*tests,
+                                  runs=options['n'],
+                                  warmup=warmup if warmup >= 0 else None,
+                                  cpu=cpu if cpu >= 0 else None)
+
+    def command_stress(self, *args):
+        """
+        Compare the solution against a brute-force solution on random
+        inputs. The problem directory must contain a generator and
+        a brute-force solution in any language, named "gen" and "brute"
+        by default (see settings). The generator receives a seed as
+        argument and writes an input. Iterations run in parallel and
+        stop at the first wrong answer, timeout or crash. The failing
+        input is shrunk and saved as a new test case. To set the number
+        of iterations, type it as argument. To set the number of
+        parallel jobs or the first seed, type `-j` or `-s` followed by
+        the number.
+        """
+        assert self.current_problem, 'there is no problem selected'
+        args, options = parse_options(args, j=0, s=1)
+        iterations = int(args[0]) if args else self.get('stress-iterations')
+        Stress(self.workbench).run(iterations,
+                                   jobs=options['j'],
+                                   seed=options['s'])
+
+    def command_scale(self, *args):
+        """
+        Estimate the time complexity of the solution by running it on
+        inputs of growing size. The problem directory must contain
+        a generator (see `stress`), which receives a seed and the size
+        of the input as arguments. Sizes grow geometrically up to the
+        maximum size, which must be typed as argument, and run in
+        parallel until one of them exceeds the time limit. The growth of
+        CPU time is fitted to the usual complexity classes and the time
+        for the maximum size is predicted. To set the first size or the
+        growth factor, type `-s` or `-f` followed by the number. To set
+        the number of parallel jobs, type `-j` followed by the number.
+        """
+        assert self.current_problem, 'there is no problem selected'
+        args, options = parse_options(args, s=0, f=0.0, j=0)
+        assert len(args) == 1, 'maximum size must be typed as argument'
+        Scale(self.workbench).run(int(args[0]),
+                                  start=options['s'],
+                                  factor=options['f'],
+                                  jobs=options['j'])
+
+    def command_split(self, *args):
+        """
+        Find the slowest cases of a test whose input holds many cases,
+        and the first case whose output diverges from the answer. Each
+        case runs alone in parallel, and prefixes of the cases are then
+        searched for the first one whose output is not the start of the
+        answer, or adds nothing to the output of the cases before it, so
+        a case that correctly prints nothing may be reported too. Type
+        the name of the test followed by the rule to split its input:
+        `count` when the first line holds the number of cases, `blank`
+        when cases are separated by blank lines, or `end` followed by
+        the terminator line when cases end with one, such as `end 0 0`.
+        The rule is kept for the problem, so it may be left out
+        afterwards. Cases take one line unless `-l` is typed followed by
+        the number of lines. To set the number of parallel jobs, type
+        `-j` followed by the number.
+        """
+        assert self.current_problem, 'there is no problem selected'
+        args, options = parse_options(args, l=0, j=0)
+        assert args, 'name of the test must be typed as argument'
+        Split(self.workbench).run(args[0],
+                                  rule=args[1:],
+                                  size=options['l'],
+                                  jobs=options['j'])
+
+    def command_matrix(self, *args):
+        """
+        Compare the solutions of the current problem in every language.
+        Each source named after the source pattern of a language in the
+        settings is compiled, and all of them run on all tests in
+        parallel. A table shows the verdict, CPU time and peak memory of
+        each language on each test, and whether their outputs are the
+        same. Generated tests are not run. To set the number of parallel
+        jobs, type `-j` followed by the number.
+        """
+        assert self.current_problem, 'there is no problem selected'
+        _, options = parse_options(args, j=0)
+        Matrix(self.workbench).run(jobs=options['j'])
 
     def command_files(self, *args):
         """
@@ -436,8 +654,70 @@ class Toolbox:
         Save the solution and remove the problem. This operation only
         works for problems that have been accepted by the online judge
         (use `check` to validate it). The source code is moved to the
-        solution directory. All other files related to the problem are
-        permanently removed (see `remove`).
+        solution directory, along with its tests compressed in a zip
+        archive (see `regress`), or into the packed archive when set
+        (see `pack`). All other files related to the problem
+        are permanently removed (see `remove`).
         """
         problem = self.problemset.get_problem(*args)
         self.workbench.archive(problem)
+
+    def command_calibrate(self, *args):
+        """
+        Calibrate the prediction of judge runtimes. Archived solutions
+        accepted by the online judge are tested again with their tests
+        (see `archive`), and their local CPU times are paired with their
+        judge runtimes to fit a model for each language. Afterwards,
+        `test` and `bench` print the predicted judge runtime, along with
+        a band where most judge runtimes fall, next to the time limit.
+        Outcomes are kept as in `regress`. To calibrate with only some
+        volumes, type their numbers. To run every solution again, type
+        `--fresh`. To set the number of parallel jobs, type `-j`
+        followed by the number; by default, the setting of `test` is
+        used, since parallel runs slow each other down.
+        """
+        volumes, options = parse_options(args, j=0, fresh=False)
+        Calibration(self).run(*map(int, volumes),
+                              jobs=options['j'] or self.get('test-jobs'),
+                              fresh=options['fresh'])
+
+    def command_pack(self, *args):
+        """
+        Manage the packed solution archive. When `solution-pack` is set
+        in the settings, `archive` packs solutions and their tests into
+        that single file of the solution directory, replacing the
+        previous solution of the problem in the same language. Type
+        `list` to list packed solutions, or `extract` to write them to
+        the solution directory, followed by volume numbers to restrict
+        them. Type `add` to pack the solutions already saved in the
+        solution directory.
+        """
+        assert args and args[0] in ['list', 'extract', 'add'
+                                   ], ('type `list`, `extract` or `add`')
+        pack = SolutionPack(self)
+        assert pack.enabled, 'solution pack is not set in the settings'
+        volumes = [int(volume) for volume in args[1:]]
+        if args[0] == 'list':
+            pack.list(volumes)
+        elif args[0] == 'extract':
+            pack.extract(volumes)
+        else:
+            pack.add(volumes)
+
+    def command_regress(self, *args):
+        """
+        Test again all archived solutions whose tests were archived along
+        with them (see `archive`). Solutions are compiled and tested in
+        parallel, using all processors by default. Failures, timeouts and
+        solutions within the margin of the time limit in the settings
+        are listed. Outcomes are kept, so only solutions whose source,
+        compiler, tests or time limit changed run again, and a run that
+        is interrupted resumes where it stopped. To test only some
+        volumes, type their numbers. To run every solution again, type
+        `--fresh`. To set the number of parallel jobs, type `-j`
+        followed by the number.
+        """
+        volumes, options = parse_options(args, j=0, fresh=False)
+        Regress(self).run(*map(int, volumes),
+                          jobs=options['j'],
+                          fresh=options['fresh'])
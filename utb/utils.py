@@ -62,3 +62,32 @@ def trim(docstring):
     while trimmed and not trimmed[0]:
         trimmed.pop(0)
     return '\n'.join(trimmed)
+
+
+def parse_options(args, **options):
+    # Options are given as keyword arguments mapping their names to default
+    # values. A boolean default declares a flag (e.g. `--fresh`), any other
+    # default expects a value right after the option (e.g. `-j 4`) that is
+    # converted to the type of the default when it is not None.
+    values = dict(options)
+    positional = []
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        name = arg.lstrip('-').replace('-', '_')
+        if not arg.startswith('-') or arg == '-' or name not in options:
+            positional.append(arg)
+        elif isinstance(options[name], bool):
+            values[name] = True
+        else:
+            if not args:
+                raise Exception('missing value for option: %s' % arg)
+            value = args.pop(0)
+            default = options[name]
+            try:
+                values[name] = (type(default)(value)
+                                if default is not None else value)
+            except ValueError:
+                raise Exception('invalid value for option %s: %s' %
+                                (arg, value))
+    return positional, values
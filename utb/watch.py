@@ -0,0 +1,134 @@
+# utb: UVa Online Judge toolbox
+# Copyright (C) 2024-2025  Daniel Donadon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import datetime
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .submission import Submission
+
+
+class Watch:
+    # The source and the test files of the current problem are polled from
+    # a background thread, which holds the lock of the console while it
+    # compiles and tests, so it never runs along with a command
+    EXTENSIONS = ('.in', '.ans', '.gen')
+
+    def __init__(self, toolbox):
+        self.toolbox = toolbox
+        self.thread = None
+        self.stopped = threading.Event()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        interval = max(0.1, self.toolbox.get('watch-interval'))
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.loop,
+                                       args=(interval,),
+                                       daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.thread = None
+
+    def snapshot(self, workbench):
+        files = {}
+        for name in os.listdir(workbench.dir()):
+            if name == workbench.source or name.endswith(self.EXTENSIONS):
+                try:
+                    stat = os.stat(workbench.get_filename(name))
+                    files[name] = stat.st_size, stat.st_mtime_ns
+                except FileNotFoundError:
+                    pass
+        return files
+
+    def loop(self, interval):
+        # Changes are only handled once a poll finds no new change, so
+        # files are not read while an editor is still saving them
+        problem, before, changed = None, {}, set()
+        while not self.stopped.wait(interval):
+            with self.toolbox.console.lock:
+                workbench = self.toolbox.workbench
+                try:
+                    after = self.snapshot(workbench)
+                except (AttributeError, FileNotFoundError):
+                    # There is no problem selected or it was removed
+                    problem = None
+                    continue
+                if workbench.problem != problem:
+                    problem, before, changed = workbench.problem, after, set()
+                    continue
+                changes = {
+                    name for name in before.keys() | after.keys()
+                    if before.get(name) != after.get(name)
+                }
+                before = after
+                if changes:
+                    changed |= changes
+                elif changed:
+                    try:
+                        self.update(workbench, changed)
+                    except Exception as e:
+                        self.toolbox.console.notify('Error', str(e))
+                    changed = set()
+
+    def update(self, workbench, changed):
+        # A change of the source runs every test, while a change of a test
+        # file runs only that test
+        source = workbench.source in changed
+        if source:
+            if not workbench.check_source_file(exception=False):
+                return
+            if not workbench.compile(quiet=True):
+                self.report('source changed', 'compilation failed')
+                return
+        testcases = workbench.get_testcases()
+        if source:
+            tests = sorted(testcases)
+        else:
+            tests = sorted({os.path.splitext(name)[0] for name in changed} &
+                           testcases.keys())
+        if not tests:
+            return
+        jobs = max(1, self.toolbox.get('test-jobs') or 1)
+        timeout = workbench.problem.time_limit / 1000
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            results = list(
+                executor.map(
+                    lambda test: workbench.run_test(test, testcases[test],
+                                                    timeout), tests))
+        failures = [
+            '%s %s' % (test, Submission.VERDICT_CODES[result['verdict']][0]
+                       if result['verdict'] not in [None, 90] else 'stderr')
+            for test, result in zip(tests, results)
+            if not workbench.passed(result)
+        ]
+        slowest = max(
+            result['usage'].user + result['usage'].system for result in results)
+        self.report(
+            'source changed' if source else ', '.join(tests) + ' changed',
+            '%d/%d passed' % (len(tests) - len(failures), len(tests)),
+            'slowest %.3fs' % slowest, *failures)
+
+    def report(self, *fields):
+        time = datetime.datetime.now().strftime('%H:%M:%S')
+        self.toolbox.console.notify(time, '  '.join(fields))
@@ -15,14 +15,44 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import datetime
+import hashlib
+import io
+import json
 import os
+import resource
 import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
 
+from .cache import CompileCache, ResultCache
+from .calibration import Calibration
+from .compare import Comparator, Difference
+from .forkserver import ForkServerPool
+from .harness import JavaHarnessPool
+from .history import TestHistory
+from .pack import SolutionPack
+from .program import Program
+from .store import SnapshotStore, TestStore
+from .submission import Submission
 from .utils import trim
 
 
 class Workbench:
     current_filename = '.current'
+    # Languages whose test cases may run on long-lived servers, given by the
+    # setting that enables them and the class of their pool
+    SERVER_POOLS = {
+        'python': ('fork-server', ForkServerPool),
+        'java': ('harness', JavaHarnessPool)
+    }
+    MEMORY_ERRORS = [
+        b'bad_alloc', b'MemoryError', b'OutOfMemoryError',
+        b'Cannot allocate memory'
+    ]
 
     def __init__(self, toolbox):
         self.toolbox = toolbox
@@ -31,6 +61,12 @@ class Workbench:
         self._filename = os.path.join(self.base_dir, self.current_filename)
         toolbox.makedir(self._filename)
         self.problem = None
+        self.servers = {}
+        self.store = TestStore(toolbox)
+        self.results = ResultCache(toolbox)
+        self.history = TestHistory(toolbox)
+        self.snapshots = SnapshotStore(toolbox)
+        self.checking = None
         self.load()
         try:
             current = toolbox.read_json(self._filename, default=None)
@@ -55,6 +91,10 @@ class Workbench:
                                            problem.number,
                                            ': %s' % problem.name,
                                            sep='')
+            restored = self.store.restore(problem, dir)
+            if restored:
+                self.toolbox.console.alternate('Restored', restored,
+                                               'test files from the store')
         self.works.add(problem)
 
     def select(self, problem=None):
@@ -97,27 +137,33 @@ class Workbench:
             return False
         return True
 
+    @property
+    def program(self):
+        return Program(self.toolbox,
+                       self.source_path,
+                       language=self.toolbox.get('language'),
+                       problem=self.problem)
+
     @property
     def exe(self):
-        exe = self.toolbox.get_language('exe')
-        if not exe:
-            return None
-        kwargs = self.toolbox.account.as_kwargs()
-        kwargs.update(self.problem.as_kwargs())
-        return exe.format(**kwargs)
+        return self.program.exe
 
     @property
     def exe_path(self):
-        exe = self.exe
-        return self.get_filename(exe) if exe else None
+        return self.program.exe_path
 
     def get_testcases(self):
+        self.store.sync(self.problem, self.dir())
         testcases = {}
         for input in os.listdir(self.dir()):
             if input.endswith('.in'):
                 testcase = input[:-3]
                 answer = self.get_filename(f'{ testcase }.ans')
                 testcases[testcase] = os.path.isfile(answer)
+        for input in os.listdir(self.dir()):
+            if input.endswith('.gen') and input[:-4] not in testcases:
+                generator = self.read_generator(input[:-4])
+                testcases[input[:-4]] = generator[1] is not None
         return testcases
 
     def edit(self):
@@ -130,17 +176,26 @@ class Workbench:
                 stream.write(trim(template.format(**kwargs)))
         self.toolbox.process.open('editor', self.source_path)
 
+    def next_test_name(self):
+        testcases = self.get_testcases()
+        test = 'a'
+        while test in testcases:
+            test = chr(ord(test) + 1)
+        return test
+
     def edit_test(self, test=None):
         assert self.problem, 'there is no problem selected'
         if not test:
-            testcases = self.get_testcases()
-            test = 'a'
-            while test in testcases:
-                test = chr(ord(test) + 1)
+            test = self.next_test_name()
         input = self.get_filename(f'{ test }.in')
         answer = self.get_filename(f'{ test }.ans')
         self.toolbox.process.open('editor', '"%s" "%s"' % (input, answer))
 
+    def import_tests(self, path):
+        assert self.problem, 'there is no problem selected'
+        imported = self.store.import_tests(self.problem, self.dir(), path)
+        self.toolbox.console.alternate('Imported', len(imported), 'test files')
+
     def remove(self, problem, force=False):
         assert problem in self.works, 'problem is not being solved'
         if not force:
@@ -158,35 +213,32 @@ class Workbench:
             except (AssertionError, KeyboardInterrupt):
                 self.toolbox.console.print('Operation aborted')
                 return
+        self.store.sync(problem, self.dir(problem))
         shutil.rmtree(self.dir(problem))
         self.works.remove(problem)
         if problem == self.problem:
             self.problem = None
         self.toolbox.console.print('Problem removed')
 
-    def compile(self):
-        if self.exe is None:
-            self.toolbox.console.print('There is no need to compile')
-            return
+    def compile(self, force=False, quiet=False):
         self.check_source_file()
-        if os.path.isfile(self.exe_path):
-            os.remove(self.exe_path)
-        result = self.toolbox.process.run('compile',
-                                          source=self.source,
-                                          exe=self.exe,
-                                          language=True,
-                                          dir=self.dir())
-        return result == 0
-
-    def test(self, *suite):
+        self.snapshots.take(self.problem, self.source_path,
+                            self.toolbox.get('language'))
+        checker = self.get_checker()
+        if checker and not checker.compile(quiet=True):
+            self.toolbox.console.print('Checker did not compile')
+            return False
+        return self.program.compile(force=force, quiet=quiet)
+
+    def get_checker(self):
+        name = self.toolbox.get('checker')
+        return Program.find(self.toolbox, self.dir(), name,
+                            self.problem) if name else None
+
+    def test(self, *suite, jobs=None, fresh=False, fail_fast=False):
         self.check_source_file()
-        if self.exe is not None:
-            source_date = os.path.getctime(self.source_path)
-            exe_date = (os.path.getctime(self.exe_path)
-                        if os.path.isfile(self.exe_path) else 0)
-            if exe_date < source_date:
-                if not self.compile():
-                    return
+        if not self.compile(quiet=True):
+            return
         testcases = self.get_testcases()
         for test in suite:
             if test not in testcases:
@@ -194,55 +246,533 @@ class Workbench:
         if not testcases:
             self.toolbox.console.print('There are no test cases to run')
             return True
-        self.toolbox.console.print('Running tests with a time limit of %d ms' %
-                                   self.problem.time_limit)
+        jobs = max(1, jobs or self.toolbox.get('test-jobs') or 1)
+        self.toolbox.console.alternate(
+            'Time limit', '%.3fs' % (self.problem.time_limit / 1000),
+            ' Best time', '%.3fs' % (self.problem.best_time / 1000),
+            ' Parallel jobs', jobs)
         timeout = self.problem.time_limit / 1000
-        success = True
-        for test in suite if suite else sorted(testcases.keys()):
-            kwargs = {
-                'exe': self.exe,
-                'time': '.time',
-                'input': f'{ test }.in',
-                'output': f'{ test }.out',
-                'answer': f'{ test }.ans',
-                'error': f'{ test }.err'
-            }
-            kwargs['run'] = self.toolbox.get_language('run').format(**kwargs)
-            self.toolbox.console.alternate('Test ', test, '...', sep='', end='')
-            code = self.toolbox.process.run('time',
+        tests = suite if suite else sorted(testcases.keys())
+        width = max(4, max(len(test) for test in tests))
+        self.toolbox.console.print('%-*s' % (width, 'Test'),
+                                   '%7s' % 'User',
+                                   '%7s' % 'System',
+                                   '%7s' % 'Wall',
+                                   '%9s' % 'Memory',
+                                   '%5s' % 'Limit',
+                                   'Verdict',
+                                   bold=True,
+                                   sep='  ')
+        checker = self.get_checker()
+        if self.problem.special and not checker:
+            self.toolbox.console.alternate(
+                'Warning:', 'the problem has a special judge and there is no',
+                'checker', 'to accept other correct answers')
+        success, total, worst, spilled = True, 0, 0, False
+        served = 0
+        interrupted = False
+        shutil.rmtree(self.scratch_dir(), ignore_errors=True)
+        tests = self.history.schedule(self.problem, tests, jobs)
+        outcomes, cached = {}, []
+        results = self.results.load(self.problem)
+        keys = self.result_keys(tests) if self.results.enabled else {}
+        # Checkers run on their own threads, so checking a test overlaps
+        # with running the next ones
+        with ThreadPoolExecutor(max_workers=jobs) as executor, \
+                ThreadPoolExecutor(max_workers=jobs) as checking:
+            self.checking = checking if checker else None
+            try:
+                futures = []
+                for test in tests:
+                    entry = None if fresh else results.get(keys.get(test))
+                    if entry:
+                        futures.append(Future())
+                        futures[-1].set_result(ResultCache.decode(entry))
+                    else:
+                        futures.append(
+                            executor.submit(self.run_test, test,
+                                            testcases[test], timeout))
+                # Results are printed in order as soon as they are
+                # available, so the output of parallel jobs never
+                # interleaves
+                for test, future in zip(tests, futures):
+                    self.toolbox.console.print('%-*s' % (width, test),
+                                               bold=True,
+                                               end='  ')
+                    result = future.result()
+                    if 'pending' in result:
+                        result = result.pop('pending').result()
+                    cpu = result['usage'].user + result['usage'].system
+                    total += cpu
+                    worst = max(worst, cpu)
+                    spilled = spilled or result.get('spilled', False)
+                    served += result.get('served', False)
+                    passed = self.print_result(result)
+                    success = passed and success
+                    if result.get('cached'):
+                        cached.append(test)
+                    else:
+                        outcomes[test] = passed, result['usage']
+                        if keys.get(test):
+                            results.pop(keys[test], None)
+                            if ResultCache.cacheable(result):
+                                results[keys[test]] = ResultCache.encode(result)
+                    if fail_fast and not success:
+                        for future in futures:
+                            future.cancel()
+                        break
+            except KeyboardInterrupt:
+                # Queued tests are dropped and running ones are killed, so
+                # leaving the executors does not wait for the whole suite
+                executor.shutdown(wait=False, cancel_futures=True)
+                checking.shutdown(wait=False, cancel_futures=True)
+                self.toolbox.process.kill_all()
+                self.toolbox.console.print()
+                interrupted, success = True, False
+            finally:
+                self.checking = None
+        self.results.save(self.problem, results)
+        language = self.toolbox.get('language')
+        for test, kind, value, best in self.history.regressions(
+                self.problem, language, outcomes):
+            self.toolbox.console.alternate('Warning:', test, 'regressed in',
+                                           kind, 'to', value, 'from', best,
+                                           'in the best previous run')
+        self.history.record(self.problem, self.program_digest(), language,
+                            outcomes)
+        finished = len(outcomes) + len(cached)
+        if finished < len(tests):
+            self.toolbox.console.alternate(
+                'Interrupted,'
+                if interrupted else 'Stopped at the first failure,',
+                len(tests) - finished, 'tests skipped')
+        if success and worst:
+            Calibration(self.toolbox).print_prediction(self.problem, language,
+                                                       worst)
+        if spilled:
+            self.toolbox.console.alternate('Outputs of failing tests saved in',
+                                           self.scratch_dir())
+        # Only tests run on a server saved its startup, as cached tests did
+        # not run and generated tests ran in their own processes
+        servers = self.get_server_pool()
+        if servers and served:
+            startup = servers.measure_startup()
+            self.toolbox.console.alternate('Total time', '%.3fs' % total,
+                                           'without startup,',
+                                           '%.3fs' % (total + startup * served),
+                                           'with it',
+                                           '(%.3fs per test)' % startup)
+        return success
+
+    def program_digest(self):
+        # The key of the last build of the solution, or the hash of its
+        # source when it is not compiled
+        program = self.program
+        stamps = self.toolbox.read_json(os.path.join(
+            program.dir, CompileCache.stamp_filename),
+                                        default={})
+        build = stamps.get(program.exe) if program.exe else None
+        if build is None:
+            build = self.store.digest(self.problem, program.dir, program.source)
+        return build
+
+    def result_keys(self, tests):
+        # The result of a test depends on the build of the solution, on the
+        # input and the answer, and on the settings used to run and judge
+        # it. Generated tests depend on their commands too, so they are
+        # never cached
+        build = self.program_digest()
+        checker = self.get_checker()
+        if checker:
+            build += self.store.digest(self.problem, self.dir(),
+                                       os.path.basename(checker.source_path))
+        settings = [
+            self.toolbox.get_language('run'),
+            self.problem.time_limit,
+            self.get_limits(),
+            self.get_server_pool() is not None,
+        ] + [
+            self.toolbox.get(key)
+            for key in ['compare', 'compare-tolerance', 'diff', 'memory-limit']
+        ]
+        prefix = json.dumps([build, settings], default=str)
+        keys = {}
+        for test in tests:
+            if os.path.isfile(self.get_filename(f'{ test }.gen')):
+                continue
+            digest = hashlib.sha256(prefix.encode())
+            for extension in ['in', 'ans']:
+                filename = f'{ test }.{ extension }'
+                file_digest = self.store.digest(self.problem, self.dir(),
+                                                filename)
+                digest.update(f'{ file_digest }\0'.encode())
+            keys[test] = digest.hexdigest()
+        return keys
+
+    def get_server_pool(self):
+        # Python solutions may run on forks of a pre-started interpreter and
+        # Java solutions on a single JVM, which skips the startup of the
+        # interpreter on every test case
+        language = self.toolbox.get('language')
+        if language not in self.SERVER_POOLS:
+            return None
+        setting, pool = self.SERVER_POOLS[language]
+        if not self.toolbox.get_language(setting):
+            return None
+        if language not in self.servers:
+            # A server that cannot be started, such as a harness that does
+            # not compile, is not tried again and cases run on their own
+            try:
+                self.servers[language] = pool(self.toolbox)
+            except Exception as error:
+                self.servers[language] = None
+                self.toolbox.console.alternate(
+                    'Warning:', str(error),
+                    'so each test case runs in its own process')
+        return self.servers[language]
+
+    def close(self):
+        # Servers are stopped when the workbench is replaced or on exit
+        for servers in self.servers.values():
+            if servers:
+                servers.close()
+        self.servers = {}
+
+    def run_test(self, test, has_answer, timeout, affinity=None):
+        kwargs = {
+            'exe': self.exe,
+            'source': self.source,
+            'input': f'{ test }.in',
+            'output': f'{ test }.out',
+            'answer': f'{ test }.ans',
+            'error': f'{ test }.err'
+        }
+        result = {'difference': None, 'stderr': False, 'verdict': None}
+        generator = self.read_generator(test)
+        if not generator:
+            return self.execute_test(test, has_answer, timeout, affinity,
+                                     result, None, [], kwargs)
+        # The solution may wait for a slow generator, so its time limit is
+        # checked against CPU time while the timeout gives it extra time
+        processes = self.start_generator(generator[0])
+        try:
+            result = self.execute_test(
+                test, has_answer, timeout + self.toolbox.get('stress-timeout'),
+                affinity, result, generator, processes, kwargs)
+        finally:
+            self.stop_generator(processes)
+        usage = result['usage']
+        if result['verdict'] != 50 and usage.user + usage.system > timeout:
+            result['usage'] = usage._replace(timeout=True)
+            result['verdict'] = 50
+        return result
+
+    def execute_test(self, test, has_answer, timeout, affinity, result,
+                     generator, processes, kwargs):
+        # A generated input is read by the solution straight from the pipe
+        # of its generator, which cannot be shared with a server
+        pass_fds = ()
+        if processes:
+            pass_fds = (processes[0].stdout.fileno(),)
+            kwargs['input'] = '/proc/self/fd/%d' % pass_fds[0]
+        servers = None if processes else self.get_server_pool()
+        if not servers and self.toolbox.get('test-pipes'):
+            return self.pipe_test(test, has_answer, timeout, affinity, result,
+                                  generator, pass_fds, **kwargs)
+        if servers:
+            usage = servers.measure(self.dir(),
+                                    timeout=timeout,
+                                    limits=self.get_limits(),
+                                    affinity=affinity,
+                                    **kwargs)
+            result['served'] = True
+        else:
+            usage = self.toolbox.process.measure('run',
+                                                 language=True,
+                                                 dir=self.dir(),
+                                                 timeout=timeout,
+                                                 limits=self.get_limits(),
+                                                 affinity=affinity,
+                                                 pass_fds=pass_fds,
+                                                 **kwargs)
+        result['usage'] = usage
+        result['verdict'] = self.get_verdict(usage,
+                                             self.get_filename(kwargs['error']))
+        if result['verdict'] is None:
+            if has_answer and self.checking and not generator:
+                result['pending'] = self.checking.submit(
+                    self.judge, result, **kwargs)
+            elif has_answer:
+                self.judge(result, generator=generator, **kwargs)
+            result['stderr'] = os.path.getsize(
+                self.get_filename(kwargs['error'])) > 0
+        return result
+
+    def pipe_test(self, test, has_answer, timeout, affinity, result, generator,
+                  pass_fds, input, output, error, **kwargs):
+        # The input is read once and the output and error are captured in
+        # memory, so a passing test case writes nothing to the problem
+        # directory. Outputs of failing cases are spilled to a scratch
+        # directory, preferably in memory too
+        if pass_fds:
+            data = pass_fds[0]
+        else:
+            with open(self.get_filename(input), 'rb') as stream:
+                data = stream.read()
+        capacity = self.toolbox.get('output-limit') << 20
+        usage, output, error = self.toolbox.process.pipe(
+            'run',
+            data,
+            language=True,
+            dir=self.dir(),
+            timeout=timeout,
+            limits=self.get_limits(),
+            affinity=affinity,
+            capacity=capacity or None,
+            **kwargs)
+        result['usage'] = usage
+        result['verdict'] = self.get_verdict(usage, error)
+        if result['verdict'] is None:
+            result['stderr'] = len(error) > 0
+            if has_answer and not generator and (self.toolbox.get('compare')
+                                                 == 'diff' or
+                                                 self.get_checker()):
+                output = self.spill(test, 'out', output)
+            if has_answer and self.checking and not generator:
+                self.spill(test, 'err', error)
+                result['pending'] = self.checking.submit(self.judge,
+                                                         result,
+                                                         spilled=True,
+                                                         input=input,
+                                                         output=output,
+                                                         **kwargs)
+            elif has_answer:
+                self.judge(result,
+                           generator=generator,
+                           input=input,
+                           output=output,
+                           **kwargs)
+        # Cases with no answer pass unless they crash, while accepted cases
+        # that wrote to the error stream fail, so what they wrote is kept
+        if not self.passed(result) and 'pending' not in result:
+            self.spill(test, 'out', output)
+            self.spill(test, 'err', error)
+            result['spilled'] = True
+        return result
+
+    def read_generator(self, test):
+        # A generated test case has a file with the command that writes its
+        # input and, optionally, the command of a reference solution that
+        # writes its answer from that input
+        filename = self.get_filename(f'{ test }.gen')
+        if not os.path.isfile(filename):
+            return None
+        with open(filename) as stream:
+            commands = [line.strip() for line in stream if line.strip()]
+        assert commands, f'generator command not found: { test }.gen'
+        return commands[0], commands[1] if len(commands) > 1 else None
+
+    def start_generator(self, command, reference=None):
+        # Returns the processes of the pipeline, the last one producing the
+        # stream to be read
+        processes = [
+            subprocess.Popen(command,
+                             shell=True,
+                             cwd=self.dir(),
+                             stdin=subprocess.DEVNULL,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.DEVNULL,
+                             start_new_session=True)
+        ]
+        if reference:
+            processes.append(
+                subprocess.Popen(reference,
+                                 shell=True,
+                                 cwd=self.dir(),
+                                 stdin=processes[0].stdout,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.DEVNULL,
+                                 start_new_session=True))
+            processes[0].stdout.close()
+        return processes
+
+    def stop_generator(self, processes):
+        for process in processes:
+            if process.poll() is None:
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            process.stdout.close()
+            process.wait()
+
+    def check_reference(self, result, output, generator):
+        # The generator runs again to feed the reference solution, whose
+        # output is compared as it is produced
+        comparator = Comparator(self.toolbox)
+        processes = self.start_generator(*generator)
+        timer = threading.Timer(self.toolbox.get('stress-timeout'),
+                                self.stop_generator, [processes])
+        timer.start()
+        try:
+            result['difference'] = comparator.compare(output,
+                                                      processes[-1].stdout)
+            code = processes[-1].wait() if not result['difference'] else 0
+        finally:
+            timer.cancel()
+            self.stop_generator(processes)
+        assert code == 0, 'reference solution failed'
+        return result['difference'] is None
+
+    def scratch_dir(self):
+        base = self.toolbox.get('test-scratch-dir')
+        if not os.path.isdir(base):
+            base = tempfile.gettempdir()
+        return os.path.join(base, 'utb-%d' % os.getuid(),
+                            str(self.problem.number))
+
+    def spill(self, test, extension, content):
+        if isinstance(content, str):
+            return content
+        filename = os.path.join(self.scratch_dir(), f'{ test }.{ extension }')
+        self.toolbox.makedir(filename)
+        with open(filename, 'wb') as stream:
+            stream.write(content)
+        return filename
+
+    def get_verdict(self, usage, error):
+        # Returns the verdict of a failed run, or None if it ended normally
+        # Memory is checked first, since a program that exceeds the limit
+        # may be swapping or leaking until it times out
+        memory = self.toolbox.get('memory-limit')
+        if memory and usage.memory > memory << 10:
+            return 60
+        if usage.timeout:
+            return 50
+        if usage.code == -signal.SIGXFSZ:
+            return 45
+        if usage.code != 0:
+            return 60 if self.out_of_memory(error) else 40
+        return None
+
+    def get_limits(self, language=None):
+        limits = {}
+        memory = self.toolbox.get_language(
+            'address-space-limit',
+            self.toolbox.get('address-space-limit'),
+            language=language)
+        if memory:
+            limits[resource.RLIMIT_AS] = memory << 20
+        stack = self.toolbox.get('stack-limit')
+        if stack:
+            limits[resource.RLIMIT_STACK] = stack << 20
+        output = self.toolbox.get('output-limit')
+        if output:
+            limits[resource.RLIMIT_FSIZE] = output << 20
+        return limits
+
+    def out_of_memory(self, error):
+        # A failed allocation usually crashes the program, so a failed run is
+        # taken as out of memory when it reports so. The error is either the
+        # name of its file or its content
+        if isinstance(error, bytes):
+            tail = error[-4096:]
+        elif os.path.isfile(error):
+            with open(error, 'rb') as stream:
+                stream.seek(max(0, os.path.getsize(error) - 4096))
+                tail = stream.read()
+        else:
+            return False
+        return any(marker in tail for marker in self.MEMORY_ERRORS)
+
+    def judge(self, result, generator=None, spilled=False, **kwargs):
+        passed = self.check_answer(result, generator=generator, **kwargs)
+        result['verdict'] = 90 if passed else 70
+        if spilled and (not passed or result['stderr']):
+            result['spilled'] = True
+        return result
+
+    def check_answer(self, result, output, answer, generator=None, **kwargs):
+        if generator:
+            if not isinstance(output, bytes):
+                output = self.get_filename(output)
+            return self.check_reference(result, output, generator)
+        checker = self.get_checker()
+        if checker:
+            return self.check_special(result, checker, kwargs['input'], output,
+                                      answer)
+        if self.toolbox.get('compare') == 'diff':
+            code = self.toolbox.process.run('diff',
                                             echo=False,
                                             dir=self.dir(),
-                                            timeout=timeout,
+                                            output=output,
+                                            answer=answer,
                                             **kwargs)
-            timefile = self.get_filename(kwargs['time'])
-            if os.path.isfile(timefile):
-                with open(timefile) as stream:
-                    time = stream.readline()[:-1]
-                if time.startswith('0'):
-                    self.toolbox.console.print('  ', time, end='')
-                os.remove(timefile)
-            if code == -1:
-                success = False
-                self.toolbox.console.print('  Timeout', bold=True, end='')
-            elif code != 0:
-                success = False
-                self.toolbox.console.print('  Error', bold=True, end='')
-            else:
-                if not testcases[test]:
-                    self.toolbox.console.alternate('  ', 'Okay', end='')
-                else:
-                    result = self.toolbox.process.run('diff',
-                                                      echo=False,
-                                                      dir=self.dir(),
-                                                      **kwargs)
-                    success = success and result == 0
-                    self.toolbox.console.alternate(
-                        '  ', 'Wrong answer' if result else 'Accepted', end='')
-                if os.path.getsize(self.get_filename(kwargs['error'])):
-                    success = False
-                    self.toolbox.console.print('  (stderr output)', end='')
-            self.toolbox.console.print()
-        return success
+            result['difference'] = Difference(None, None) if code else None
+        else:
+            comparator = Comparator(self.toolbox)
+            if not isinstance(output, bytes):
+                output = self.get_filename(output)
+            result['difference'] = comparator.compare(output,
+                                                      self.get_filename(answer))
+        return result['difference'] is None
+
+    def check_special(self, result, checker, input, output, answer):
+        # The checker receives the input, the output and the answer, and
+        # accepts the output when it exits with 0. As in testlib, codes 1
+        # and 2 reject it and any other code means the checker failed
+        paths = [
+            os.path.abspath(self.get_filename(path))
+            for path in [input, output, answer]
+        ]
+        command = checker.command(*paths,
+                                  input=os.devnull,
+                                  output=os.devnull,
+                                  error=os.devnull)
+        usage = self.toolbox.process.profile(
+            command,
+            dir=checker.dir,
+            timeout=self.toolbox.get('stress-timeout'))
+        assert usage.code in [0, 1, 2], 'checker failed'
+        result['difference'] = Difference(None, None) if usage.code else None
+        return result['difference'] is None
+
+    @staticmethod
+    def passed(result):
+        return result['verdict'] in [None, 90] and not result['stderr']
+
+    def print_result(self, result):
+        usage = result['usage']
+        self.toolbox.console.print('%6.3fs' % usage.user,
+                                   '%6.3fs' % usage.system,
+                                   '%6.3fs' % usage.wall,
+                                   '%6.1f MB' % (usage.memory / 1024),
+                                   '%4.0f%%' %
+                                   (100 * (usage.user + usage.system) /
+                                    (self.problem.time_limit / 1000)),
+                                   sep='  ',
+                                   end='  ')
+        verdict = result['verdict']
+        if verdict is None:
+            self.toolbox.console.print('Okay', bold=True, end='')
+        else:
+            self.toolbox.console.print(Submission.VERDICT_CODES[verdict][1],
+                                       bold=True,
+                                       end='')
+            if verdict == 70:
+                self.print_difference(result['difference'])
+        if result['stderr']:
+            self.toolbox.console.print('  (stderr output)', end='')
+        if result.get('cached'):
+            self.toolbox.console.print('  (cached)', end='')
+        self.toolbox.console.print()
+        return self.passed(result)
+
+    def print_difference(self, difference):
+        if difference.line is not None:
+            self.toolbox.console.print('  (line %d, column %d)' %
+                                       (difference.line, difference.column),
+                                       end='')
 
     def files(self):
         assert self.problem, 'there is no problem selected'
@@ -251,8 +781,8 @@ class Workbench:
         for file in sorted(os.listdir(self.dir())):
             if not file.startswith('.'):
                 path = self.get_filename(file)
-                bold = (file == source or file.endswith('.in') or
-                        file.endswith('.ans'))
+                bold = (file == source or file.endswith(
+                    ('.in', '.ans', '.gen')))
                 date = datetime.datetime.fromtimestamp(os.path.getctime(path))
                 self.toolbox.console.print(date.strftime('%b %d %Y %H:%M:%S'),
                                            end='  ')
@@ -264,11 +794,41 @@ class Workbench:
             'problem has not been accepted yet')
         assert os.path.isfile(self.source_path), ('source file not found: ' +
                                                   self.source_path)
-        dir = self.toolbox.get('solution-dir')
-        if self.toolbox.get('use-volume-in-solution-dir'):
-            dir = os.path.join(dir, str(problem.volume))
-        solution = os.path.join(dir, self.source)
-        self.toolbox.makedir(solution)
-        shutil.move(self.source_path, solution)
-        self.toolbox.console.alternate('Solution saved at', solution)
+        pack = SolutionPack(self.toolbox)
+        if pack.enabled:
+            with open(self.source_path, 'rb') as stream:
+                source = stream.read()
+            tests = io.BytesIO()
+            has_tests = self.archive_tests(problem, tests)
+            pack.put(problem.number, self.toolbox.get('language'), self.source,
+                     source,
+                     tests.getvalue() if has_tests else None)
+            os.remove(self.source_path)
+            self.toolbox.console.alternate('Solution packed in', pack.filename)
+        else:
+            dir = self.toolbox.get('solution-dir')
+            if self.toolbox.get('use-volume-in-solution-dir'):
+                dir = os.path.join(dir, str(problem.volume))
+            solution = os.path.join(dir, self.source)
+            self.toolbox.makedir(solution)
+            shutil.move(self.source_path, solution)
+            self.toolbox.console.alternate('Solution saved at', solution)
+            tests = os.path.join(dir, '%d.tests.zip' % problem.number)
+            if self.archive_tests(problem, tests):
+                self.toolbox.console.alternate('Tests saved at', tests)
         self.remove(problem, force=True)
+
+    def archive_tests(self, problem, archive):
+        # Tests are kept compressed along with the solution, so it can be
+        # tested again later (see `regress`). The archive is either a
+        # filename or a binary stream
+        filenames = [
+            filename for filename in sorted(os.listdir(self.dir(problem)))
+            if filename.endswith(('.in', '.ans'))
+        ]
+        if not filenames:
+            return False
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as stream:
+            for filename in filenames:
+                stream.write(self.get_filename(filename, problem), filename)
+        return True